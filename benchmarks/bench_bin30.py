@@ -0,0 +1,85 @@
+"""
+Parity check + benchmark: vectorized etl.bin30 vs the previous groupby/lambda version.
+
+    python benchmarks/bench_bin30.py [hours ...]
+"""
+import os, sys, time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import etl  # noqa: E402
+
+
+def legacy_bin30(df: pd.DataFrame) -> pd.DataFrame:
+    df2 = df.copy()
+    df2["v_flat"] = etl.v_flat_from_grade(df2["v"].values, df2["grade"].values)
+    df2["valid_v"] = (df2["v"].between(0,10)).astype(int)
+    df2["valid_hr"] = (df2["hr"].between(35,220)).astype(int)
+    df2["valid_flat"] = 1
+    df2["is_move"] = (df2["v"]*3.6 >= 1.0).astype(int)
+    df2["bin"] = (df2["t"] // 30).astype(int)
+    agg = df2.groupby("bin").agg(
+        seconds=("t","count"),
+        v_kmh=("v", lambda x: 3.6*np.nanmean(x)),
+        vflat_kmh=("v_flat", lambda x: 3.6*np.nanmean(x)),
+        hr_bpm=("hr","mean"),
+        grade=("grade","mean"),
+        coverage=("valid_v","mean"),
+        f_v=("valid_v","mean"),
+        f_hr=("valid_hr","mean"),
+        f_flat=("valid_flat","mean"),
+        is_move=("is_move","mean"),
+    ).reset_index()
+    agg["valid_bin"] = (agg["coverage"]>=0.5) & (agg["v_kmh"]>=1.0)
+    return agg
+
+
+def synthetic_frame(hours: float, seed: int = 0) -> pd.DataFrame:
+    """1 Hz frame with hills, a few speed/HR dropouts and an all-NaN bin."""
+    rng = np.random.default_rng(seed)
+    n = int(hours * 3600)
+    t = np.arange(n) + 17
+    v = np.clip(3.2 + 0.4*np.sin(t/300) + rng.normal(0, 0.2, n), 0, 10)
+    v[rng.random(n) < 0.01] = np.nan
+    v[600:630] = np.nan
+    hr = np.clip(140 + 10*np.sin(t/500) + rng.normal(0, 2, n), 35, 220)
+    hr[rng.random(n) < 0.02] = np.nan
+    grade = np.clip(0.05*np.sin(t/120), -0.2, 0.2)
+    return pd.DataFrame({"t": t, "v": v, "hr": hr, "grade": grade, "distance": np.nancumsum(v)})
+
+
+def check_parity(df: pd.DataFrame):
+    import warnings
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # nanmean of an all-NaN bin
+        old = legacy_bin30(df)
+    new = etl.bin30(df)
+    assert list(old.columns) == list(new.columns), (old.columns, new.columns)
+    assert len(old) == len(new)
+    for c in old.columns:
+        a, b = old[c].to_numpy(dtype=float), new[c].to_numpy(dtype=float)
+        assert np.allclose(a, b, rtol=1e-12, atol=1e-12, equal_nan=True), c
+
+
+def best_of(fn, *args, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main(hours=(1, 4, 12)):
+    for h in hours:
+        df = synthetic_frame(float(h))
+        check_parity(df)
+        t_old = best_of(legacy_bin30, df)
+        t_new = best_of(etl.bin30, df)
+        print(f"{h:>5}h  n={len(df):>6}  legacy {t_old*1e3:8.2f} ms  vectorized {t_new*1e3:7.2f} ms  x{t_old/t_new:5.1f}")
+    print("parity OK")
+
+
+if __name__ == "__main__":
+    main([float(x) for x in sys.argv[1:]] or (1, 4, 12))
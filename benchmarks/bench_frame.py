@@ -0,0 +1,58 @@
+"""
+Peak memory / time: DataFrame ETL path vs compact ActivityFrame, per activity.
+
+    python benchmarks/bench_frame.py [hours ...]
+"""
+import os, sys, time, tracemalloc
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import etl  # noqa: E402
+from utils.frame import ActivityFrame  # noqa: E402
+
+
+def synthetic_streams(hours: float, seed: int = 0):
+    """Array-valued key_by_type payload (as read from the stream store) with 5% dropped samples."""
+    rng = np.random.default_rng(seed)
+    n = int(hours * 3600)
+    t = np.arange(n)
+    keep = rng.random(n) > 0.05
+    keep[[0, -1]] = True
+    t = t[keep]
+    v = np.clip(3 + rng.normal(0, .3, len(t)), 0, 10)
+    return {
+        "time": {"data": t.astype(np.int32)},
+        "distance": {"data": np.cumsum(v)},
+        "velocity_smooth": {"data": v},
+        "altitude": {"data": 100 + 20*np.sin(t/400)},
+        "heartrate": {"data": np.rint(140 + 5*np.sin(t/100)).astype(np.int32)},
+    }
+
+
+def legacy(streams):
+    return etl.bin30(etl.compute_grade(etl.resample_to_1hz(streams)))
+
+
+def compact(streams):
+    return ActivityFrame.from_streams(streams).compute_grade().bins()
+
+
+def measure(fn, streams):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    fn(streams)
+    dt = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1e6, dt * 1e3
+
+
+def main(hours=(1, 6, 24)):
+    for h in hours:
+        s = synthetic_streams(float(h))
+        (m0, t0), (m1, t1) = measure(legacy, s), measure(compact, s)
+        print(f"{h:>5}h  DataFrame {m0:7.1f} MB {t0:8.1f} ms   ActivityFrame {m1:7.1f} MB {t1:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main([float(x) for x in sys.argv[1:]] or (1, 6, 24))
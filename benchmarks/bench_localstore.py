@@ -0,0 +1,80 @@
+"""
+Benchmark: bulk-append a multi-year 30 s bin history into the local store and
+run history-wide aggregates over it.
+
+    python benchmarks/bench_localstore.py [n_activities] [--db /tmp/bench.sqlite]
+
+Default: 25 000 activities x 120 bins (1 h each) = 3M rows, spread over
+3 users and ~4 years.
+"""
+import os, sys, time, argparse, tempfile
+import numpy as np
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+from utils import etl  # noqa: E402
+from utils.localstore import SQLiteStore  # noqa: E402
+from synthetic import synthetic_streams  # noqa: E402
+
+WEEKLY = """
+SELECT user_id, strftime('%Y-%W', start_date_utc) AS week,
+       COUNT(DISTINCT activity_id) AS activities, SUM(seconds) AS seconds,
+       AVG(vflat_kmh) AS vflat_kmh, SUM(CASE WHEN vflat_kmh >= ? THEN seconds ELSE 0 END) AS s_above_cs
+FROM bins30 WHERE valid_bin = 1
+GROUP BY user_id, week ORDER BY user_id, week
+"""
+
+
+def history(n_activities: int, seed: int = 0) -> pd.DataFrame:
+    """One real 1 h bins frame tiled across activities with per-activity speed noise."""
+    bins = etl.bin30(etl.compute_grade(etl.resample_to_1hz(synthetic_streams(1.0, seed=seed))))
+    rng = np.random.default_rng(seed)
+    k = len(bins)
+    df = pd.concat([bins] * n_activities, ignore_index=True)
+    act = np.repeat(np.arange(n_activities, dtype=np.int64) + 10_000_000, k)
+    scale = np.repeat(rng.normal(1.0, 0.05, n_activities), k)
+    df["v_kmh"] *= scale
+    df["vflat_kmh"] *= scale
+    start = pd.Timestamp("2022-01-01") + pd.to_timedelta(np.repeat(np.arange(n_activities) * 4800, k), unit="s")
+    df.insert(0, "start_date_utc", start)
+    df.insert(0, "activity_id", act)
+    df.insert(0, "user_id", np.repeat([f"user-{i % 3}" for i in range(n_activities)], k))
+    return df
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("n_activities", nargs="?", type=int, default=25_000)
+    ap.add_argument("--db", default=None, help="store path (default: a temp file)")
+    args = ap.parse_args(argv)
+    path = args.db or os.path.join(tempfile.mkdtemp(), "bench.sqlite")
+
+    t0 = time.perf_counter()
+    df = history(args.n_activities)
+    print(f"generated {len(df):>10,} rows          {time.perf_counter() - t0:7.2f}s")
+
+    store = SQLiteStore(path)
+    t0 = time.perf_counter()
+    store.append_frame("bins30", df)
+    dt = time.perf_counter() - t0
+    print(f"append_frame                      {dt:7.2f}s  ({len(df) / dt:,.0f} rows/s)")
+
+    t0 = time.perf_counter()
+    store.create_index("bins30", ["activity_id"])
+    print(f"index on activity_id              {time.perf_counter() - t0:7.2f}s")
+
+    t0 = time.perf_counter()
+    weekly = store.query(WEEKLY, (12.0,))
+    print(f"weekly aggregate ({len(weekly):,} rows)      {time.perf_counter() - t0:7.2f}s")
+
+    t0 = time.perf_counter()
+    one = store.select_page("bins30", "*", {"eq": {"activity_id": 10_000_000 + args.n_activities // 2}},
+                            "bin", limit=1000)
+    print(f"one activity ({len(one)} bins)            {(time.perf_counter() - t0) * 1e3:7.2f}ms")
+    print(f"store size {os.path.getsize(path) / 2**20:,.0f} MiB at {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Cold-start and rerun latency of the Streamlit app, per view (offline, AppTest).
+
+    python benchmarks/bench_startup.py                 # all views, 20 reruns each
+    python benchmarks/bench_startup.py --reruns 50 --view "VTS Profiles"
+
+Each view runs in a fresh interpreter, like a new container:
+
+    import_ms   streamlit + AppTest import (common to every layout of the app)
+    cold_ms     first script run (landing view: module imports, config, sidebar)
+    view_ms     first run of the selected view (its lazy imports)
+    rerun_ms    median / p90 of later reruns of that view
+    heavy       which of plotly.express / supabase / scipy got imported along the way
+
+Secrets are dummies and nobody is signed in, so no network is touched.
+"""
+import os, sys, json, time, argparse, statistics, subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP = os.path.join(os.path.dirname(HERE), "streamlit_app.py")
+VIEWS = ["Dashboard", "Workloads & Zones", "VTS Profiles", "Plan & Targets"]
+HEAVY = ["plotly.express", "supabase", "scipy"]  # streamlit itself imports plotly.graph_objects
+
+
+def child(view: str, reruns: int) -> dict:
+    t0 = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    t_import = time.perf_counter() - t0
+
+    at = AppTest.from_file(APP, default_timeout=120)
+    at.secrets["app"] = {}
+    at.secrets["strava"] = {"client_id": "1", "client_secret": "x", "redirect_uri": "http://localhost"}
+    at.secrets["supabase"] = {"url": "http://localhost:1", "anon_key": "k"}
+    t0 = time.perf_counter()
+    at.run()
+    t_cold = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    at.sidebar.radio[0].set_value(view).run()
+    t_view = time.perf_counter() - t0
+    times = []
+    for _ in range(reruns):
+        t0 = time.perf_counter()
+        at.run()
+        times.append(time.perf_counter() - t0)
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    times.sort()
+    return {"view": view, "import_ms": 1e3 * t_import, "cold_ms": 1e3 * t_cold, "view_ms": 1e3 * t_view,
+            "rerun_ms": 1e3 * statistics.median(times), "rerun_p90_ms": 1e3 * times[int(0.9 * (len(times) - 1))],
+            "heavy": [m for m in HEAVY if m in sys.modules]}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--view", action="append", choices=VIEWS)
+    ap.add_argument("--reruns", type=int, default=20)
+    ap.add_argument("--child", help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+    if args.child:
+        print(json.dumps(child(args.child, args.reruns)))
+        return 0
+
+    print(f"{'view':<20} {'import':>8} {'cold':>8} {'view':>8} {'rerun':>8} {'p90':>8}  heavy modules")
+    for view in args.view or VIEWS:
+        out = subprocess.run([sys.executable, __file__, "--child", view, "--reruns", str(args.reruns)],
+                             capture_output=True, text=True)
+        if out.returncode:
+            print(f"{view:<20} failed: {out.stderr.strip().splitlines()[-1:]}")
+            continue
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"{view:<20} {r['import_ms']:8.0f} {r['cold_ms']:8.0f} {r['view_ms']:8.0f} "
+              f"{r['rerun_ms']:8.1f} {r['rerun_p90_ms']:8.1f}  {', '.join(r['heavy']) or '-'}")
+    print("(ms; rerun = median of later reruns of the view)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""
+Parity check + benchmark: streamjson (bytes -> ndarrays) vs json.loads (+ orjson
+when installed) on synthetic key_by_type stream payloads.
+
+    python benchmarks/bench_streamjson.py [hours ...]
+
+Decode time is the best of 5; peak is the tracemalloc high-water mark while
+decoding (the body itself excluded). "+ETL" times decode plus resample_to_1hz,
+since list payloads pay their conversion there.
+"""
+import os, sys, json, time, tracemalloc
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+from utils import etl, streamjson  # noqa: E402
+from synthetic import synthetic_streams  # noqa: E402
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def body_for(hours: float) -> bytes:
+    streams = synthetic_streams(hours, gaps="dropouts", terrain="hills", as_lists=True)
+    return json.dumps(streams).encode()
+
+
+def check_parity(body: bytes):
+    ref, got = json.loads(body), streamjson.decode_chunks(
+        body[i:i + streamjson.CHUNK_BYTES] for i in range(0, len(body), streamjson.CHUNK_BYTES))
+    assert ref.keys() == got.keys()
+    for k, s in ref.items():
+        exp = np.array([np.nan if x is None else x for x in s["data"]])
+        np.testing.assert_array_equal(got[k]["data"], exp)
+        assert {m: v for m, v in s.items() if m != "data"} == {m: v for m, v in got[k].items() if m != "data"}
+
+
+def measure(fn, repeat: int = 5):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+
+def main(hours_list):
+    decoders = {"json.loads": json.loads}
+    if orjson is not None:
+        decoders["orjson.loads"] = orjson.loads
+    decoders["streamjson"] = streamjson.loads_streams
+    decoders["streamjson chunked"] = lambda b: streamjson.decode_chunks(
+        b[i:i + streamjson.CHUNK_BYTES] for i in range(0, len(b), streamjson.CHUNK_BYTES))
+
+    print(f"{'hours':>5} {'MiB':>6}  {'decoder':<20} {'decode ms':>10} {'peak MiB':>9} {'+ETL ms':>9}")
+    for h in hours_list:
+        body = body_for(h)
+        check_parity(body)
+        for name, dec in decoders.items():
+            t, peak = measure(lambda: dec(body))
+            t_etl, _ = measure(lambda: etl.resample_to_1hz(dec(body)), repeat=3)
+            print(f"{h:5g} {len(body) / 2**20:6.1f}  {name:<20} {1e3 * t:10.1f} {peak / 2**20:9.1f} {1e3 * t_etl:9.1f}")
+
+
+if __name__ == "__main__":
+    main([float(a) for a in sys.argv[1:]] or [1, 6, 24])
@@ -0,0 +1,161 @@
+"""
+ETL / model benchmark suite on synthetic Strava payloads, with stored baselines.
+
+    python benchmarks/suite.py                  # run and print
+    python benchmarks/suite.py --save           # (re)write benchmarks/baseline.json
+    python benchmarks/suite.py --check          # exit 1 on regression vs the baseline
+    python benchmarks/suite.py --quick --check  # cases up to 2 h only
+
+Per case (see synthetic.CASES) each stage is timed on its own input
+(best of --repeat runs) and its peak allocation is measured with
+tracemalloc in a separate run:
+
+    resample_to_1hz -> compute_grade -> bin30 -> zone_table
+    estimate_cs_wprime (mean-max points of the activity) -> baseline_vts
+
+A stage regresses when it is slower than time_tol x baseline (and by more
+than --min-delta-ms, so microsecond stages do not flap), or allocates more
+than mem_tol x its baseline peak. Baselines are machine-specific: save them
+on the machine that runs --check. Everything runs offline.
+"""
+import os, sys, json, time, platform, argparse, tracemalloc
+from typing import Any, Callable, Dict, List
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+from utils import etl, vts, meanmax  # noqa: E402
+from synthetic import CASES, synthetic_streams  # noqa: E402
+
+BASELINE = os.path.join(HERE, "baseline.json")
+TIME_TOL, MEM_TOL, MIN_DELTA_MS = 1.5, 1.25, 2.0
+CS_KMH, ZONES = 12.0, etl.DEFAULT_ZONES
+
+
+def stages(streams: Dict[str, Any]) -> List[tuple]:
+    """(name, fn) per stage; each fn gets a fresh copy of the previous stage's output."""
+    df1 = etl.resample_to_1hz(streams)
+    graded = etl.compute_grade(df1.copy())
+    bins = etl.bin30(graded)
+    pts = meanmax.cs_points(meanmax.activity_curve(graded))
+    if len(pts) < 3:  # short activity: fall back to a fixed set of steady bests
+        pts = [(180.0, 16.0), (600.0, 14.5), (1200.0, 13.8)]
+    cs, wp = vts.estimate_cs_wprime(pts)
+    return [
+        ("resample_to_1hz", lambda: etl.resample_to_1hz(streams)),
+        ("compute_grade", lambda: etl.compute_grade(df1.copy())),
+        ("bin30", lambda: etl.bin30(graded)),
+        ("zone_table", lambda: etl.zone_table(bins, CS_KMH, ZONES)),
+        ("estimate_cs_wprime", lambda: vts.estimate_cs_wprime(pts)),
+        ("baseline_vts", lambda: vts.baseline_vts(cs, wp)),
+    ]
+
+
+def best_time(fn: Callable, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def peak_bytes(fn: Callable) -> int:
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(cases=CASES, repeat: int = 5) -> Dict[str, Dict[str, Dict[str, float]]]:
+    out = {}
+    for name, hours, kw in cases:
+        streams = synthetic_streams(hours, seed=0, **kw)
+        res = {}
+        for stage, fn in stages(streams):
+            fn()  # warm-up (lazy imports, caches)
+            res[stage] = {"time_ms": round(1e3 * best_time(fn, repeat if hours < 12 else max(repeat // 2, 1)), 4),
+                          "peak_mb": round(peak_bytes(fn) / 2**20, 3)}
+        out[name] = res
+    return out
+
+
+def compare(results, baseline, time_tol: float = TIME_TOL, mem_tol: float = MEM_TOL,
+            min_delta_ms: float = MIN_DELTA_MS) -> List[str]:
+    """Regression messages (empty if none). Cases/stages missing from the baseline are skipped."""
+    bad = []
+    for case, res in results.items():
+        for stage, m in res.items():
+            b = baseline.get("cases", {}).get(case, {}).get(stage)
+            if not b:
+                continue
+            if m["time_ms"] > time_tol * b["time_ms"] and m["time_ms"] - b["time_ms"] > min_delta_ms:
+                bad.append(f"{case}/{stage}: {m['time_ms']:.2f} ms vs baseline {b['time_ms']:.2f} ms")
+            if m["peak_mb"] > mem_tol * b["peak_mb"] and m["peak_mb"] - b["peak_mb"] > 0.5:
+                bad.append(f"{case}/{stage}: peak {m['peak_mb']:.1f} MB vs baseline {b['peak_mb']:.1f} MB")
+    return bad
+
+
+def print_table(results, baseline=None):
+    base = (baseline or {}).get("cases", {})
+    print(f"{'case':<20} {'stage':<19} {'time ms':>10} {'x base':>7} {'peak MB':>9} {'x base':>7}")
+    for case, res in results.items():
+        for stage, m in res.items():
+            b = base.get(case, {}).get(stage)
+            rt = f"{m['time_ms'] / b['time_ms']:.2f}" if b and b["time_ms"] else ""
+            rm = f"{m['peak_mb'] / b['peak_mb']:.2f}" if b and b["peak_mb"] else ""
+            print(f"{case:<20} {stage:<19} {m['time_ms']:>10.3f} {rt:>7} {m['peak_mb']:>9.2f} {rm:>7}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="ETL benchmark suite on synthetic Strava streams")
+    ap.add_argument("--save", action="store_true", help=f"write results as the baseline ({BASELINE})")
+    ap.add_argument("--check", action="store_true", help="fail on regressions against the baseline")
+    ap.add_argument("--baseline", default=BASELINE)
+    ap.add_argument("--quick", action="store_true", help="only cases up to 2 h")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--time-tol", type=float, default=None)
+    ap.add_argument("--mem-tol", type=float, default=None)
+    ap.add_argument("--min-delta-ms", type=float, default=MIN_DELTA_MS)
+    args = ap.parse_args(argv)
+
+    cases = [c for c in CASES if not args.quick or c[1] <= 2]
+    results = run(cases, repeat=args.repeat)
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_table(results, baseline)
+
+    if args.save:
+        old = (baseline or {}).get("cases", {}) if args.quick else {}
+        doc = {
+            "meta": {"python": platform.python_version(), "numpy": np.__version__,
+                     "machine": platform.machine(), "saved": time.strftime("%Y-%m-%d")},
+            "time_tol": args.time_tol or (baseline or {}).get("time_tol", TIME_TOL),
+            "mem_tol": args.mem_tol or (baseline or {}).get("mem_tol", MEM_TOL),
+            "cases": {**old, **results},
+        }
+        with open(args.baseline, "w") as f:
+            json.dump(doc, f, indent=1, sort_keys=True)
+        print(f"baseline saved to {args.baseline}")
+    if args.check:
+        if baseline is None:
+            print(f"no baseline at {args.baseline}; run with --save first", file=sys.stderr)
+            return 2
+        bad = compare(results, baseline,
+                      args.time_tol or baseline.get("time_tol", TIME_TOL),
+                      args.mem_tol or baseline.get("mem_tol", MEM_TOL), args.min_delta_ms)
+        for msg in bad:
+            print("REGRESSION", msg, file=sys.stderr)
+        if bad:
+            return 1
+        print("no regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
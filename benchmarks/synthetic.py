@@ -0,0 +1,106 @@
+"""
+Deterministic synthetic Strava stream payloads (key_by_type shape) for benchmarks.
+
+    streams = synthetic_streams(hours=2, gaps="pauses", terrain="hills", hr=False, seed=3)
+
+Same arguments + seed -> identical payload. Channels follow the API:
+{"data": [...], "series_type": "distance", "original_size": n, "resolution": "high"}.
+
+gaps
+    none      1 Hz, no missing samples
+    dropouts  5% of samples lost at random (GPS/BLE dropouts)
+    pauses    auto-pause: every ~20 min a 30-300 s stop with no samples
+    smart     Garmin "smart recording": 1-7 s between samples
+terrain
+    flat      ±1 m noise
+    hills     rolling 400 m-period hills plus long climbs/descents; pace slows uphill
+"""
+from typing import Any, Dict
+import numpy as np
+
+GAPS = ("none", "dropouts", "pauses", "smart")
+TERRAIN = ("flat", "hills")
+
+
+def _channel(data, series_type: str = "distance") -> Dict[str, Any]:
+    return {"data": data, "series_type": series_type, "original_size": len(data), "resolution": "high"}
+
+
+def _sample_times(n_s: int, gaps: str, rng: np.random.Generator) -> np.ndarray:
+    t = np.arange(n_s)
+    if gaps == "none":
+        return t
+    if gaps == "dropouts":
+        keep = rng.random(n_s) > 0.05
+        keep[[0, -1]] = True
+        return t[keep]
+    if gaps == "pauses":
+        keep = np.ones(n_s, dtype=bool)
+        for start in range(1200, n_s - 300, 1200):
+            keep[start:start + int(rng.integers(30, 301))] = False
+        return t[keep]
+    if gaps == "smart":
+        steps = rng.integers(1, 8, n_s)
+        t = np.cumsum(steps) - steps[0]
+        return t[t < n_s]
+    raise ValueError(f"unknown gap pattern {gaps!r} (one of {GAPS})")
+
+
+def synthetic_streams(hours: float = 1.0, gaps: str = "none", terrain: str = "hills", hr: bool = True,
+                      altitude: bool = True, seed: int = 0, as_lists: bool = True) -> Dict[str, Any]:
+    """
+    One activity's stream payload. as_lists=True gives plain Python lists like
+    a decoded API response; False gives NumPy arrays like the stream store.
+    """
+    if terrain not in TERRAIN:
+        raise ValueError(f"unknown terrain {terrain!r} (one of {TERRAIN})")
+    rng = np.random.default_rng(seed)
+    n_s = max(int(hours * 3600), 2)
+    t = _sample_times(n_s, gaps, rng)
+    moving = np.zeros(n_s, dtype=bool)
+    moving[t] = True            # paused seconds (no samples) cover no distance
+
+    # pace: easy base with slow drift and fartlek surges, slower uphill
+    sec = np.arange(n_s)
+    pace = 3.0 + 0.25 * np.sin(sec / 900.0) + 0.6 * (np.sin(sec / 97.0) > 0.92)
+    if terrain == "hills":
+        # altitude as a function of distance, so grade is well-defined
+        def alt_at(d):
+            return 200 + 12 * np.sin(d / 400.0 * 2 * np.pi) + 60 * np.sin(d / 7000.0 * 2 * np.pi)
+        approx = np.cumsum(pace)
+        slope = np.gradient(alt_at(approx), approx, edge_order=1)
+        pace = pace * (1 - 4.0 * np.clip(slope, -0.1, 0.15))
+    v_true = np.clip(pace + rng.normal(0, 0.15, n_s), 0.5, 8.0) * moving
+    dist_s = np.cumsum(v_true)
+    if terrain == "hills":
+        alt_s = alt_at(dist_s) + rng.normal(0, 0.3, n_s)
+    else:
+        alt_s = 100 + rng.normal(0, 1.0, n_s)
+
+    dist = np.round(dist_s[t], 1)
+    vel = np.round(np.clip(v_true[t] + rng.normal(0, 0.05, len(t)), 0, None), 3)
+    out = {
+        "time": _channel(t.astype(np.int64), "distance"),
+        "distance": _channel(dist),
+        "velocity_smooth": _channel(vel),
+    }
+    if altitude:
+        out["altitude"] = _channel(np.round(alt_s[t], 1))
+    if hr:
+        hr_s = 120 + 12 * (v_true / 3.0) + 15 * (1 - np.exp(-sec / 1800.0)) + rng.normal(0, 2, n_s)
+        out["heartrate"] = _channel(np.rint(np.clip(hr_s[t], 60, 200)).astype(np.int64))
+    if as_lists:
+        for ch in out.values():
+            ch["data"] = ch["data"].tolist()
+    return out
+
+
+# (name, hours, generator kwargs): 30 min .. 24 h, every gap pattern, missing HR / altitude
+CASES = [
+    ("30min_clean",        0.5, dict(gaps="none", terrain="hills")),
+    ("2h_pauses",          2.0, dict(gaps="pauses", terrain="hills")),
+    ("2h_dropouts_no_hr",  2.0, dict(gaps="dropouts", terrain="flat", hr=False)),
+    ("6h_smart_no_alt",    6.0, dict(gaps="smart", terrain="flat", altitude=False)),
+    ("6h_hills",           6.0, dict(gaps="dropouts", terrain="hills")),
+    ("24h_ultra",         24.0, dict(gaps="pauses", terrain="hills")),
+]
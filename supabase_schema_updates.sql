@@ -0,0 +1,49 @@
+-- Tables added after the initial schema (run after supabase_schema.sql; safe to re-run).
+-- Primary keys are the conflict targets of the app's upserts (utils/db.py, utils/aggregates.py).
+
+-- Incremental Strava sync: newest synced start time per user (db.save_sync_watermark).
+create table if not exists sync_state (
+  user_id     uuid primary key,
+  after_epoch bigint not null default 0,
+  updated_at  timestamptz not null default now()
+);
+
+-- Zone-load history (utils/aggregates.py). ids are deterministic text keys:
+--   activity_zone_stats  "<activity_id>:<zone>"
+--   zone_load_daily      "<user_id>:<day>:<zone>"
+--   zone_load_weekly     "<user_id>:<week>:<zone>"   (week = ISO Monday)
+create table if not exists activity_zone_stats (
+  id          text primary key,
+  user_id     uuid not null,
+  activity_id bigint not null,
+  day         date not null,
+  zone        text not null,
+  time_s      double precision not null default 0,
+  load_km     double precision not null default 0
+);
+create index if not exists ix_activity_zone_stats_activity on activity_zone_stats (activity_id);
+create index if not exists ix_activity_zone_stats_user_day on activity_zone_stats (user_id, day);
+
+create table if not exists zone_load_daily (
+  id      text primary key,
+  user_id uuid not null,
+  day     date not null,
+  zone    text not null,
+  time_s  double precision not null default 0,
+  load_km double precision not null default 0,
+  unique (user_id, day, zone)
+);
+
+create table if not exists zone_load_weekly (
+  id      text primary key,
+  user_id uuid not null,
+  week    date not null,
+  zone    text not null,
+  time_s  double precision not null default 0,
+  load_km double precision not null default 0,
+  unique (user_id, week, zone)
+);
+
+-- Synced runs not yet folded into the zone-load history (inline mode, worker.fold_pending).
+alter table activities add column if not exists folded boolean not null default false;
+alter table activities add column if not exists fold_error text;
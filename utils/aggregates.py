@@ -0,0 +1,146 @@
+"""
+Materialized zone-load aggregates per user: daily and weekly zone time and
+load, maintained incrementally.
+
+Tables (id is a deterministic text key, so plain upserts on "id" work):
+
+    activity_zone_stats(id, user_id, activity_id, day, zone, time_s, load_km)
+    zone_load_daily    (id, user_id, day, zone, time_s, load_km)
+    zone_load_weekly   (id, user_id, week, zone, time_s, load_km)   -- week = ISO Monday
+
+`activity_zone_stats` remembers what each activity contributed. When an
+activity is added or reprocessed (new CS, new ETL), its contribution is
+written first, then only the affected (day, zone) and (week, zone) rows are
+rebuilt as sums over `activity_zone_stats` for those days/weeks. History is
+never rescanned, and a retry after a partial write gives the same totals.
+Writers are expected to be serialized (one worker per user).
+"""
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+import numpy as np
+import pandas as pd
+
+try:
+    from utils import db
+except ModuleNotFoundError:
+    import db  # type: ignore
+
+KEYS = ("time_s", "load_km")
+
+
+def to_day(start_date_utc) -> str:
+    return pd.Timestamp(start_date_utc).strftime("%Y-%m-%d")
+
+
+def week_start(day: str) -> str:
+    d = date.fromisoformat(day)
+    return (d - timedelta(days=d.weekday())).isoformat()
+
+
+# ---------- pure logic ----------
+def activity_contrib(zt: pd.DataFrame, user_id: str, activity_id, day: str) -> pd.DataFrame:
+    """Zone-table rows of one activity -> contribution rows."""
+    out = pd.DataFrame({
+        "user_id": user_id,
+        "activity_id": activity_id,
+        "day": day,
+        "zone": zt["zone"].to_numpy() if len(zt) else np.array([], dtype=object),
+        "time_s": zt["time_s"].to_numpy(dtype=float) if len(zt) else np.array([]),
+        "load_km": zt["load_km"].to_numpy(dtype=float) if len(zt) else np.array([]),
+    })
+    out["id"] = [f"{activity_id}:{z}" for z in out["zone"]]
+    return out
+
+
+def period_totals(stats: pd.DataFrame, keys: List[tuple], user_id: str, period: str) -> List[Dict[str, Any]]:
+    """
+    Aggregate rows for `keys` ((period value, zone) pairs) summed from contribution
+    rows that carry a `period` column; keys without contributions become zero rows.
+    """
+    sums = {}
+    if len(stats):
+        sums = stats.groupby([period, "zone"])[list(KEYS)].sum().to_dict("index")
+    rows = []
+    for key in sorted(set(keys)):
+        tot = sums.get(key, {})
+        rows.append({
+            "id": f"{user_id}:{key[0]}:{key[1]}",
+            "user_id": user_id,
+            period: key[0],
+            "zone": key[1],
+            **{k: round(float(tot.get(k) or 0.0), 6) for k in KEYS},
+        })
+    return rows
+
+
+# ---------- persistence ----------
+def apply_activity(user_id: str, activity_id, start_date_utc, zt: pd.DataFrame) -> int:
+    """
+    Fold one activity's zone table into the daily/weekly aggregates (insert or
+    reprocess). Idempotent. Returns the number of aggregate rows written.
+    """
+    day = to_day(start_date_utc)
+    new = activity_contrib(zt, user_id, activity_id, day)
+    old = pd.DataFrame(db.select("activity_zone_stats", {"activity_id": activity_id},
+                                 columns=["id", "day", "zone", *KEYS]),
+                       columns=["id", "day", "zone", *KEYS])
+
+    # 1) the activity's own contribution first; zones it no longer has are kept as zero rows
+    gone = [{"id": r["id"], "user_id": user_id, "activity_id": activity_id, "day": day, "zone": r["zone"],
+             "time_s": 0.0, "load_km": 0.0}
+            for r in old.to_dict("records") if r["zone"] not in set(new["zone"])]
+    db.upsert("activity_zone_stats", gone + new.to_dict("records"))
+
+    # 2) rebuild the touched (day, zone) / (week, zone) rows from the stored contributions
+    day_keys = list(zip(old["day"], old["zone"])) + list(zip(new["day"], new["zone"]))
+    if not day_keys:
+        return 0
+    weeks = sorted({week_start(d) for d, _ in day_keys})
+    stats = pd.concat([pd.DataFrame(
+        db.select("activity_zone_stats", {"user_id": user_id}, columns=["id", "day", "zone", *KEYS],
+                  gte={"day": wk}, lte={"day": (date.fromisoformat(wk) + timedelta(days=6)).isoformat()}),
+        columns=["id", "day", "zone", *KEYS]) for wk in weeks], ignore_index=True)
+    stats["week"] = stats["day"].map(week_start)
+
+    daily = period_totals(stats, day_keys, user_id, "day")
+    weekly = period_totals(stats, [(week_start(d), z) for d, z in day_keys], user_id, "week")
+    with db.WriteBuffer() as wb:
+        wb.upsert("zone_load_daily", daily)
+        wb.upsert("zone_load_weekly", weekly)
+    return len(daily) + len(weekly)
+
+
+# ---------- reads ----------
+def daily_load(user_id: str, since: Optional[str] = None) -> pd.DataFrame:
+    """Daily rows (day, zone, time_s, load_km) from the materialized table."""
+    rows = db.select("zone_load_daily", {"user_id": user_id}, columns=["id", "day", "zone", *KEYS],
+                     gte={"day": since} if since else None, cache=True)
+    return pd.DataFrame(rows, columns=["id", "day", "zone", *KEYS])
+
+
+def weekly_zone_hours(user_id: str, week: Optional[str] = None) -> pd.DataFrame:
+    """zone -> actual hours for the ISO week containing `week` (default: this week)."""
+    wk = week_start(week or datetime.utcnow().date().isoformat())
+    rows = db.select("zone_load_weekly", {"user_id": user_id, "week": wk},
+                     columns=["id", "zone", "time_s"], cache=True)
+    df = pd.DataFrame(rows, columns=["id", "zone", "time_s"])
+    return pd.DataFrame({"zone": df["zone"], "actual_h": df["time_s"].astype(float) / 3600.0})
+
+
+def acute_chronic(daily: pd.DataFrame, acute_days: int = 7, chronic_days: int = 28) -> pd.DataFrame:
+    """
+    Daily total load with rolling acute/chronic means (km of flat-equivalent
+    load per day) and their ratio, from pre-aggregated daily rows.
+    """
+    cols = ["day", "load_km", "acute_km", "chronic_km", "acwr"]
+    if daily.empty:
+        return pd.DataFrame(columns=cols)
+    tot = daily.assign(day=pd.to_datetime(daily["day"])).groupby("day")["load_km"].sum()
+    tot = tot.asfreq("D", fill_value=0.0)
+    out = pd.DataFrame({
+        "load_km": tot,
+        "acute_km": tot.rolling(acute_days, min_periods=1).mean(),
+        "chronic_km": tot.rolling(chronic_days, min_periods=1).mean(),
+    })
+    out["acwr"] = out["acute_km"] / out["chronic_km"].replace(0.0, np.nan)
+    return out.rename_axis("day").reset_index()[cols]
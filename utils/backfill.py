@@ -0,0 +1,254 @@
+"""
+Batch ETL backfill: many activities -> partitioned Parquet store.
+
+    python -m utils.backfill manifest.csv --out data/etl --workers 8
+    python -m utils.backfill --user-id <uuid> --out data/etl
+
+The manifest is a CSV (or .jsonl) with columns id, user_id, start_date_utc
+(optionally access_token for activities not yet in the local stream store;
+those are downloaded up front by the parent, under one Strava rate limiter).
+Each activity runs the ETL (resample to 1 Hz -> grade -> 30 s bins, on a
+compact ActivityFrame) in a process pool and is written to
+
+    <out>/1hz/user_id=<uid>/month=<YYYY-MM>/<activity_id>.parquet
+    <out>/bins30/user_id=<uid>/month=<YYYY-MM>/<activity_id>.parquet
+
+1 Hz files keep the compact dtypes (float32 v/altitude/grade, uint8 hr with
+0 = missing). Finished ids are appended to <out>/_done.jsonl, so a
+restarted run skips them. With --load-db the 30 s bins of every finished
+activity not yet in <out>/_loaded.jsonl are upserted (key activity_id, bin)
+into the `bins30` table of the configured storage backend (see utils.db),
+e.g. a local SQLite store for history-wide analytics; a load interrupted in
+an earlier run is finished by the next one, and reloading never duplicates.
+"""
+import os, sys, json, time, argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import pandas as pd
+
+try:
+    from utils import stream_store
+    from utils.frame import ActivityFrame
+except ModuleNotFoundError:
+    import stream_store        # type: ignore
+    from frame import ActivityFrame  # type: ignore
+
+CHECKPOINT = "_done.jsonl"
+LOADED = "_loaded.jsonl"     # ids whose bins are in the db (--load-db)
+BINS_KEY = "activity_id,bin"
+
+
+def partition_path(out_dir: str, kind: str, user_id: str, start_date_utc: str, activity_id) -> str:
+    month = str(start_date_utc)[:7]
+    return os.path.join(out_dir, kind, f"user_id={user_id}", f"month={month}", f"{activity_id}.parquet")
+
+
+def _write_parquet(df: pd.DataFrame, path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def prefetch_streams(tasks: List[Dict[str, Any]], max_workers: int = 4) -> Dict[str, str]:
+    """
+    Download the streams missing from the local store, in this process, with
+    strava.iter_streams (one rate limiter and pooled session for the whole
+    backfill). Returns {activity_id: error} for the ones that could not be fetched.
+    """
+    store = stream_store.default_store()
+    by_token: Dict[str, List[Any]] = {}
+    failed: Dict[str, str] = {}
+    for t in tasks:
+        if t["id"] in store:
+            continue
+        if t.get("access_token"):
+            by_token.setdefault(t["access_token"], []).append(t["id"])
+        else:
+            failed[str(t["id"])] = f"LookupError: streams for {t['id']} not in local store and no access_token given"
+    if not by_token:
+        return failed
+    try:
+        from utils import strava as su
+    except ModuleNotFoundError:
+        import strava as su  # type: ignore
+    for token, ids in by_token.items():
+        left = set(ids)
+        try:
+            for aid, res in su.iter_streams(ids, token, max_workers=max_workers, return_exceptions=True):
+                left.discard(aid)
+                if isinstance(res, Exception):
+                    failed[str(aid)] = f"{type(res).__name__}: {res}"
+        except su.RateLimitExceeded as e:
+            # daily budget gone: the rest stays unfetched; a later run resumes them
+            for aid in left:
+                failed[str(aid)] = f"RateLimitExceeded: {e}"
+    return failed
+
+
+def _load_streams(task: Dict[str, Any]):
+    streams = stream_store.default_store().get(task["id"])
+    if streams is None:
+        raise LookupError(f"streams for {task['id']} not in local store")
+    return streams
+
+
+def process_activity(task: Dict[str, Any], out_dir: str) -> Dict[str, Any]:
+    """ETL one activity and write its partitions. Never raises: errors are returned."""
+    t0 = time.perf_counter()
+    try:
+        frame = ActivityFrame.from_streams(_load_streams(task)).compute_grade()
+        bins = frame.bins()
+        uid, start = task["user_id"], task["start_date_utc"]
+        _write_parquet(frame.to_frame(compact=True), partition_path(out_dir, "1hz", uid, start, task["id"]))
+        _write_parquet(bins, partition_path(out_dir, "bins30", uid, start, task["id"]))
+        return {"id": task["id"], "ok": True, "rows_1hz": len(frame), "bins": len(bins),
+                "elapsed_s": round(time.perf_counter() - t0, 4)}
+    except Exception as e:
+        return {"id": task["id"], "ok": False, "error": f"{type(e).__name__}: {e}"}
+
+
+def _worker(args):
+    return process_activity(*args)
+
+
+def load_checkpoint(out_dir: str, name: str = CHECKPOINT) -> set:
+    path = os.path.join(out_dir, name)
+    done = set()
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                if rec.get("ok"):
+                    done.add(str(rec["id"]))
+    return done
+
+
+def print_progress(done: int, total: int, result: Dict[str, Any]):
+    status = "ok" if result["ok"] else f"FAILED ({result['error']})"
+    print(f"[{done}/{total}] {result['id']} {status}", file=sys.stderr)
+
+
+def run_backfill(tasks: Iterable[Dict[str, Any]], out_dir: str, workers: Optional[int] = None,
+                 chunksize: int = 4, resume: bool = True,
+                 progress: Optional[Callable[[int, int, Dict[str, Any]], None]] = print_progress) -> List[Dict[str, Any]]:
+    """
+    Run the ETL for many activities across a process pool (`chunksize` tasks
+    per submission) and return one result dict per activity processed.
+    Streams not in the local store are prefetched first (prefetch_streams).
+    With resume=True activities recorded in the checkpoint are skipped.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    done = load_checkpoint(out_dir) if resume else set()
+    todo = [t for t in tasks if str(t["id"]) not in done]
+    results = []
+    if not todo:
+        return results
+    workers = workers or os.cpu_count() or 1
+    # network in the parent only; pool processes read the stream store
+    fetch_failed = prefetch_streams(todo)
+    ready = [t for t in todo if str(t["id"]) not in fetch_failed]
+    with open(os.path.join(out_dir, CHECKPOINT), "a") as ckpt:
+        def record(res):
+            ckpt.write(json.dumps(res) + "\n")
+            ckpt.flush()
+            results.append(res)
+            if progress:
+                progress(len(results), len(todo), res)
+
+        for aid, err in fetch_failed.items():
+            record({"id": aid, "ok": False, "error": err})
+        if ready:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                for res in pool.map(_worker, [(t, out_dir) for t in ready], chunksize=chunksize):
+                    record(res)
+    return results
+
+
+def read_manifest(path: str) -> List[Dict[str, Any]]:
+    if path.endswith(".jsonl"):
+        with open(path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+    df = pd.read_csv(path, dtype={"user_id": str, "start_date_utc": str})
+    return df.to_dict("records")
+
+
+def manifest_from_db(user_id: str) -> List[Dict[str, Any]]:
+    try:
+        from utils import db
+    except ModuleNotFoundError:
+        import db  # type: ignore
+    return list(db.select_iter("activities", ["id", "user_id", "start_date_utc"], eq={"user_id": user_id}))
+
+
+def load_bins(tasks: Iterable[Dict[str, Any]], out_dir: str, table: str = "bins30",
+              batch_rows: int = 500_000) -> int:
+    """
+    Upsert the bins30 partitions of `tasks` (tagged with user/activity ids) via
+    db.append_frame on (activity_id, bin); each batch's ids are recorded in
+    <out>/_loaded.jsonl once it is written.
+    """
+    try:
+        from utils import db
+    except ModuleNotFoundError:
+        import db  # type: ignore
+    frames, ids, pending, total = [], [], 0, 0
+    with open(os.path.join(out_dir, LOADED), "a") as ckpt:
+        def flush():
+            n = db.append_frame(table, pd.concat(frames, ignore_index=True), on_conflict=BINS_KEY)
+            ckpt.write("".join(json.dumps({"id": str(i), "ok": True, "table": table}) + "\n" for i in ids))
+            ckpt.flush()
+            return n
+
+        for t in tasks:
+            path = partition_path(out_dir, "bins30", t["user_id"], t["start_date_utc"], t["id"])
+            if not os.path.exists(path):
+                continue
+            df = pd.read_parquet(path)
+            df.insert(0, "start_date_utc", str(t["start_date_utc"]))
+            df.insert(0, "activity_id", int(t["id"]))
+            df.insert(0, "user_id", str(t["user_id"]))
+            frames.append(df)
+            ids.append(t["id"])
+            pending += len(df)
+            if pending >= batch_rows:
+                total += flush()
+                frames, ids, pending = [], [], 0
+        if frames:
+            total += flush()
+    return total
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Batch ETL backfill into a partitioned Parquet store")
+    ap.add_argument("manifest", nargs="?", help="CSV/JSONL with id,user_id,start_date_utc")
+    ap.add_argument("--user-id", help="read the manifest from the activities table instead")
+    ap.add_argument("--out", default=os.path.join("data", "etl"))
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--chunksize", type=int, default=4)
+    ap.add_argument("--no-resume", action="store_true", help="ignore the checkpoint and redo everything")
+    ap.add_argument("--load-db", action="store_true", help="upsert finished, not yet loaded bins into bins30")
+    args = ap.parse_args(argv)
+    if not args.manifest and not args.user_id:
+        ap.error("give a manifest file or --user-id")
+    tasks = read_manifest(args.manifest) if args.manifest else manifest_from_db(args.user_id)
+    t0 = time.perf_counter()
+    results = run_backfill(tasks, args.out, workers=args.workers, chunksize=args.chunksize,
+                           resume=not args.no_resume)
+    failed = sum(not r["ok"] for r in results)
+    if args.load_db:
+        # finished in this or an earlier run; --no-resume reloads everything (an upsert, so no duplicates)
+        ok = load_checkpoint(args.out)
+        loaded = set() if args.no_resume else load_checkpoint(args.out, LOADED)
+        n = load_bins([t for t in tasks if str(t["id"]) in ok - loaded], args.out)
+        print(f"loaded {n} bins into bins30", file=sys.stderr)
+    print(f"processed {len(results)} activities ({failed} failed) in {time.perf_counter() - t0:.1f}s",
+          file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
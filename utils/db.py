@@ -1,75 +1,417 @@
-from typing import Optional, Dict, Any, List
-import os
-from supabase import create_client, Client
+from typing import TYPE_CHECKING, Optional, Dict, Any, List, Tuple, Iterator, Sequence, Union
+import os, json, time, threading
+from uuid import uuid4
+from datetime import datetime, timezone
+from functools import lru_cache
 import streamlit as st
 
-def get_supabase() -> Client:
+if TYPE_CHECKING:
+    from supabase import Client
+
+try:
+    from utils.cache import TTLCache
+    from utils import tracing
+except ModuleNotFoundError:
+    from cache import TTLCache  # type: ignore
+    import tracing              # type: ignore
+
+CHUNK_SIZE = 500          # rows per bulk request
+RETRIES = 3               # retries on transient errors
+BACKOFF_S = 0.5
+PAGE_SIZE = 1000          # rows per page for reads (PostgREST caps responses)
+
+# unique key used for keyset pagination of tables that have no "id" column
+KEY_COLUMNS = {"user_tokens": "user_id", "sync_state": "user_id"}
+
+# read-through cache for select(..., cache=True); writes to a table invalidate it
+read_cache = TTLCache(maxsize=256, ttl=120.0)
+
+Filters = Optional[Dict[str, Any]]
+
+@lru_cache(maxsize=1)
+def get_supabase() -> "Client":
+    """One client (and HTTP connection pool) per process; supabase is imported on first use."""
+    from supabase import create_client
     url = st.secrets["supabase"]["url"]
     key = st.secrets["supabase"]["anon_key"]
     return create_client(url, key)
 
-def upsert(table: str, rows: List[Dict[str,Any]]):
+def _is_transient(e: Exception) -> bool:
+    try:
+        import httpx
+        if isinstance(e, (httpx.TransportError, httpx.TimeoutException)):
+            return True
+    except ImportError:
+        pass
+    code = str(getattr(e, "code", "") or "")
+    return code in ("408", "429", "500", "502", "503", "504")
+
+def _execute(build, retries: int = RETRIES):
+    """Run `build().execute()`, retrying transient failures with exponential backoff."""
+    with tracing.span("db.request") as sp:
+        for attempt in range(retries + 1):
+            try:
+                res = build().execute()
+            except Exception as e:
+                if attempt >= retries or not _is_transient(e):
+                    raise
+                time.sleep(BACKOFF_S * 2 ** attempt)
+                continue
+            sp.add(rows=len(res.data) if isinstance(res.data, list) else 0, attempts=attempt + 1)
+            return res
+
+def _apply_filters(query, eq: Filters=None, gte: Filters=None, gt: Filters=None,
+                   lte: Filters=None, lt: Filters=None):
+    for op, flt in (("eq", eq), ("gte", gte), ("gt", gt), ("lte", lte), ("lt", lt)):
+        for k, v in (flt or {}).items():
+            query = getattr(query, op)(k, v)
+    return query
+
+# ---------- storage backends ----------
+class UnsupportedOperation(RuntimeError):
+    """The configured storage backend cannot do this (e.g. db.query on Supabase)."""
+
+
+class SupabaseBackend:
+    """Table operations over PostgREST (credentials from st.secrets["supabase"])."""
+    name = "supabase"
+
+    @property
+    def client(self) -> "Client":
+        return get_supabase()
+
+    def upsert(self, table: str, rows: List[Dict[str, Any]], on_conflict: str="id", retries: int=RETRIES):
+        return _execute(lambda: self.client.table(table).upsert(rows, on_conflict=on_conflict), retries).data
+
+    def insert(self, table: str, rows: List[Dict[str, Any]], retries: int=RETRIES):
+        return _execute(lambda: self.client.table(table).insert(rows), retries).data
+
+    def delete_all(self, table: str):
+        _execute(lambda: self.client.table(table).delete().neq("id", "__all__"))
+
+    def select_page(self, table: str, columns: str, filters: Dict[str, Filters], order_by: str,
+                    after: Any=None, limit: int=PAGE_SIZE) -> List[Dict[str, Any]]:
+        def build():
+            q = _apply_filters(self.client.table(table).select(columns), **filters)
+            if after is not None:
+                q = q.gt(order_by, after)
+            return q.order(order_by).limit(limit)
+        return _execute(build).data
+
+    def append_frame(self, table: str, df, chunk_rows: int=CHUNK_SIZE, on_conflict: Optional[str]=None) -> int:
+        rows = json.loads(df.to_json(orient="records", date_format="iso"))
+        for chunk in _chunks(rows, chunk_rows):
+            if on_conflict:
+                self.upsert(table, chunk, on_conflict)
+            else:
+                self.insert(table, chunk)
+        return len(rows)
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def _storage_url() -> str:
+    url = os.environ.get("ONFLOWS_DB")
+    if not url:
+        try:
+            url = st.secrets.get("storage", {}).get("url")
+        except Exception:
+            url = None  # no secrets file (CLI / tests)
+    return url or "supabase"
+
+def make_backend(url: str):
+    """'supabase' or 'sqlite:///path/to/file.sqlite' (a bare *.sqlite / *.db path also works)."""
+    if url == "supabase":
+        return SupabaseBackend()
+    if url.startswith("sqlite:///") or url.endswith((".sqlite", ".sqlite3", ".db")):
+        try:
+            from utils.localstore import SQLiteStore
+        except ModuleNotFoundError:
+            from localstore import SQLiteStore  # type: ignore
+        return SQLiteStore(url[len("sqlite:///"):] if url.startswith("sqlite:///") else url)
+    raise ValueError(f"unknown storage url {url!r}")
+
+def get_backend():
+    """The configured backend (ONFLOWS_DB, else [storage] url in secrets, else Supabase)."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = make_backend(_storage_url())
+    return _backend
+
+def set_backend(backend) -> None:
+    """Swap the backend (e.g. a local store for offline runs); clears cached reads."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+    invalidate()
+
+def _chunks(rows: List[Dict[str, Any]], size: int):
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+@tracing.traced(rows=False)
+def upsert(table: str, rows: List[Dict[str,Any]], on_conflict: str="id", chunk_size: int=CHUNK_SIZE):
     if not rows:
         return None
-    sb = get_supabase()
-    return sb.table(table).upsert(rows, on_conflict="id").execute()
+    be = get_backend()
+    res = None
+    for chunk in _chunks(rows, chunk_size):
+        res = be.upsert(table, chunk, on_conflict)
+    invalidate(table)
+    return res
 
-def insert(table: str, rows: List[Dict[str,Any]]):
+@tracing.traced(rows=False)
+def insert(table: str, rows: List[Dict[str,Any]], chunk_size: int=CHUNK_SIZE):
     if not rows:
         return None
-    sb = get_supabase()
-    return sb.table(table).insert(rows).execute()
+    be = get_backend()
+    res = None
+    for chunk in _chunks(rows, chunk_size):
+        res = be.insert(table, chunk)
+    invalidate(table)
+    return res
+
+class WriteBuffer:
+    """
+    Coalesces upsert/insert rows per table into chunked bulk requests.
+
+        with db.WriteBuffer(chunk_size=1000) as wb:
+            for bins in many_activities:
+                wb.insert("bins30", rows_for(bins))
+        # everything left is flushed on exit
+
+    Full chunks are sent as soon as they fill up; `flush()` sends the rest.
+    Upserts are de-duplicated on the conflict key (last row wins), since
+    Postgres rejects a batch that touches the same row twice. On an exception
+    inside the `with` block pending rows are dropped, not written.
+    """
+    def __init__(self, chunk_size: int=CHUNK_SIZE, retries: int=RETRIES):
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.requests = 0
+        self._upserts: Dict[Tuple[str, str], Dict[Any, Dict[str, Any]]] = {}
+        self._inserts: Dict[str, List[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def upsert(self, table: str, rows: List[Dict[str, Any]], on_conflict: str="id"):
+        keys = on_conflict.split(",")
+        with self._lock:
+            pending = self._upserts.setdefault((table, on_conflict), {})
+            for r in rows:
+                pending[tuple(r.get(k) for k in keys)] = r
+            if len(pending) >= self.chunk_size:
+                self._flush_upserts(table, on_conflict, full_only=True)
+
+    def insert(self, table: str, rows: List[Dict[str, Any]]):
+        with self._lock:
+            pending = self._inserts.setdefault(table, [])
+            pending.extend(rows)
+            if len(pending) >= self.chunk_size:
+                self._flush_inserts(table, full_only=True)
+
+    def _send(self, table: str, chunk: List[Dict[str, Any]], on_conflict: Optional[str]=None):
+        be = get_backend()
+        if on_conflict is None:
+            be.insert(table, chunk, retries=self.retries)
+        else:
+            be.upsert(table, chunk, on_conflict, retries=self.retries)
+        self.requests += 1
 
-def select(table: str, q: Optional[Dict[str, Any]]=None):
-    sb = get_supabase()
-    query = sb.table(table).select("*")
+    def _flush_upserts(self, table: str, on_conflict: str, full_only: bool=False):
+        rows = list(self._upserts.pop((table, on_conflict), {}).values())
+        while len(rows) >= (self.chunk_size if full_only else 1):
+            chunk, rows = rows[:self.chunk_size], rows[self.chunk_size:]
+            self._send(table, chunk, on_conflict)
+            invalidate(table)
+        if rows:
+            keys = on_conflict.split(",")
+            self._upserts[(table, on_conflict)] = {tuple(r.get(k) for k in keys): r for r in rows}
+
+    def _flush_inserts(self, table: str, full_only: bool=False):
+        rows = self._inserts.pop(table, [])
+        while len(rows) >= (self.chunk_size if full_only else 1):
+            chunk, rows = rows[:self.chunk_size], rows[self.chunk_size:]
+            self._send(table, chunk)
+            invalidate(table)
+        if rows:
+            self._inserts[table] = rows
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(len(v) for v in self._upserts.values()) + sum(len(v) for v in self._inserts.values())
+
+    @tracing.traced("db.WriteBuffer.flush", rows=False)
+    def flush(self) -> int:
+        """Send everything buffered; returns the number of requests made so far."""
+        with self._lock:
+            for table, on_conflict in list(self._upserts):
+                self._flush_upserts(table, on_conflict)
+            for table in list(self._inserts):
+                self._flush_inserts(table)
+        return self.requests
+
+    def clear(self):
+        with self._lock:
+            self._upserts.clear()
+            self._inserts.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+        else:
+            self.clear()
+        return False
+
+def select_iter(table: str, columns: Union[str, Sequence[str]]="*", eq: Filters=None,
+                gte: Filters=None, gt: Filters=None, lte: Filters=None, lt: Filters=None,
+                order_by: Optional[str]=None, page_size: int=PAGE_SIZE) -> Iterator[Dict[str, Any]]:
+    """
+    Stream rows with column projection, equality/range filters and keyset
+    pagination on the unique `order_by` column, e.g.
+
+        db.select_iter("activities", ["id", "start_date_utc", "distance_km"],
+                       eq={"user_id": uid}, gte={"start_date_utc": "2024-01-01"})
+
+    Each page asks for rows with order_by > last seen value, so results are
+    never silently truncated by the server's row limit and deep pages stay cheap.
+    order_by defaults to the table's key: KEY_COLUMNS[table], else "id".
+    """
+    order_by = order_by or KEY_COLUMNS.get(table, "id")
+    if not isinstance(columns, str):
+        columns = list(columns)
+        if order_by not in columns:
+            columns.append(order_by)
+        columns = ",".join(columns)
+    elif columns != "*" and order_by not in columns.split(","):
+        columns = f"{columns},{order_by}"
+    be = get_backend()
+    filters = {"eq": eq, "gte": gte, "gt": gt, "lte": lte, "lt": lt}
+    last = None
+    while True:
+        rows = be.select_page(table, columns, filters, order_by, last, page_size)
+        yield from rows
+        if len(rows) < page_size:
+            return
+        last = rows[-1][order_by]
+
+def _cache_key(table: str, columns, kw: Dict[str, Any]):
+    cols = columns if isinstance(columns, str) else tuple(columns)
+    frozen = tuple(sorted((k, tuple(sorted(v.items())) if isinstance(v, dict) else v)
+                          for k, v in kw.items()))
+    return (table, cols, frozen)
+
+@tracing.traced()
+def select(table: str, q: Filters=None, columns: Union[str, Sequence[str]]="*",
+           cache: bool=False, ttl: Optional[float]=None, **kw) -> List[Dict[str, Any]]:
+    """
+    All rows matching equality filters `q` (plus any select_iter keyword:
+    gte/gt/lte/lt/order_by/page_size). With cache=True the result is served
+    from `read_cache` when the identical query ran within `ttl` seconds.
+    """
     if q:
-        for k,v in q.items():
-            query = query.eq(k, v)
-    return query.execute().data
+        kw["eq"] = {**q, **(kw.get("eq") or {})}
+    if not cache:
+        return list(select_iter(table, columns, **kw))
+    key = _cache_key(table, columns, kw)
+    compute = lambda: list(select_iter(table, columns, **kw))
+    if ttl is None:
+        return read_cache.get_or_compute(key, compute)
+    return read_cache.get_or_compute(key, compute, ttl)
+
+def invalidate(table: Optional[str]=None) -> int:
+    """Drop cached reads for one table (or all)."""
+    if table is None:
+        return read_cache.invalidate()
+    return read_cache.invalidate(lambda k: k[0] == table)
 
+@tracing.traced(rows=False)
 def replace_table(table: str, rows: List[Dict[str,Any]]):
     """Dangerous helper for first-time loads: deletes and inserts."""
-    sb = get_supabase()
-    sb.table(table).delete().neq("id","__all__").execute()
-    if rows:
-        sb.table(table).insert(rows).execute()
-# --- NEW: users & tokens helpers -------------------------------------------
+    get_backend().delete_all(table)
+    invalidate(table)
+    insert(table, rows)
+
+@tracing.traced(rows=False)
+def append_frame(table: str, df, on_conflict: Optional[str]=None) -> int:
+    """
+    Bulk-append a DataFrame (e.g. 30 s bins of many activities); with
+    `on_conflict` (unique key columns, "a,b") it upserts instead. Returns rows written.
+    """
+    n = get_backend().append_frame(table, df, on_conflict=on_conflict)
+    invalidate(table)
+    return n
 
-from uuid import UUID
-from typing import Optional, Dict, Any
+def query(sql: str, params=()):
+    """
+    Analytic SQL over the local store, as a DataFrame. Raises
+    UnsupportedOperation on backends without SQL access (Supabase).
+    """
+    be = get_backend()
+    if not hasattr(be, "query"):
+        raise UnsupportedOperation(f"db.query needs the local backend (ONFLOWS_DB=sqlite:///path), not {be.name}")
+    return be.query(sql, params)
+
+# --- NEW: users & tokens helpers -------------------------------------------
 
+@tracing.traced(rows=False)
 def get_or_create_user(strava_athlete_id: int, extra: Optional[Dict[str, Any]]=None) -> Dict[str, Any]:
     """
     Returns a row from users_profile for this Strava athlete.
     If missing, creates it and returns the created row.
     """
-    sb = get_supabase()
+    be = get_backend()
     # 1) try find by strava_athlete_id
-    got = sb.table("users_profile").select("*").eq("strava_athlete_id", strava_athlete_id).limit(1).execute().data
+    got = be.select_page("users_profile", "*", {"eq": {"strava_athlete_id": int(strava_athlete_id)}}, "id", None, 1)
     if got:
         return got[0]
 
     payload = {
+        "id": str(uuid4()),
         "strava_athlete_id": int(strava_athlete_id),
     }
     if extra:
         payload.update(extra)
 
-    created = sb.table("users_profile").insert(payload).execute().data
+    created = be.insert("users_profile", [payload])
+    invalidate("users_profile")
     if not created:
         raise RuntimeError("Could not create users_profile")
     return created[0]
 
+@tracing.traced(rows=False)
 def save_tokens(user_id: str, tokens: Dict[str, Any]) -> None:
     """
     Upserts access/refresh tokens for this user_id into user_tokens.
     """
-    sb = get_supabase()
     row = {
         "user_id": user_id,
         "access_token": tokens.get("access_token"),
         "refresh_token": tokens.get("refresh_token"),
         "expires_at": tokens.get("expires_at"),  # epoch seconds
     }
-    sb.table("user_tokens").upsert(row, on_conflict="user_id").execute()
+    upsert("user_tokens", [row], on_conflict="user_id")
+
+# --- sync watermark ---------------------------------------------------------
+
+@tracing.traced(rows=False)
+def get_sync_watermark(user_id: str) -> int:
+    """
+    Epoch seconds of the newest activity already synced for this user (0 if none).
+    Table: sync_state(user_id uuid primary key, after_epoch bigint, updated_at timestamptz).
+    """
+    got = get_backend().select_page("sync_state", "after_epoch,user_id", {"eq": {"user_id": user_id}},
+                                    "user_id", None, 1)
+    return int(got[0]["after_epoch"] or 0) if got else 0
+
+@tracing.traced(rows=False)
+def save_sync_watermark(user_id: str, after_epoch: int) -> None:
+    row = {
+        "user_id": user_id,
+        "after_epoch": int(after_epoch),
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+    }
+    upsert("sync_state", [row], on_conflict="user_id")
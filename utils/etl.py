@@ -1,17 +1,25 @@
 from typing import Dict, Any, List, Tuple
 import numpy as np, pandas as pd
-from scipy.signal import medfilt
 import datetime as dt
+from functools import lru_cache
 
+try:
+    from utils import tracing
+except ModuleNotFoundError:
+    import tracing  # type: ignore
+
+@tracing.traced()
 def resample_to_1hz(streams: Dict[str, Any]) -> pd.DataFrame:
     """Resample Strava streams to a 1 Hz dataframe with distance (m), v (m/s), altitude (m), HR (bpm)."""
     t = streams.get("time", {}).get("data", [])
-    if not t:
+    if len(t) == 0:
         raise ValueError("No time stream")
     df = pd.DataFrame({"t": t})
     for key, target in [("distance","distance"),("velocity_smooth","v"),("altitude","altitude"),("heartrate","hr")]:
         if key in streams and "data" in streams[key]:
             df[target] = streams[key]["data"]
+        elif target in ("altitude", "hr"):
+            df[target] = np.nan  # e.g. no HR strap / no barometer
     # Fill seconds grid
     df = df.set_index("t").sort_index()
     full_index = np.arange(df.index.min(), df.index.max()+1, 1)
@@ -27,63 +35,207 @@ def resample_to_1hz(streams: Dict[str, Any]) -> pd.DataFrame:
     df["hr"] = df["hr"].clip(lower=35, upper=220)
     return df.reset_index()
 
-def compute_grade(df: pd.DataFrame) -> pd.DataFrame:
-    # grade using 10 m windows
-    d_dist = df["distance"].diff().rolling(10, min_periods=1).sum()
-    d_elev = df["altitude"].diff().rolling(10, min_periods=1).sum()
-    g = np.divide(d_elev, np.where(d_dist==0, np.nan, d_dist))
-    g = np.clip(g, -0.2, 0.2)
-    df["grade"] = g.fillna(0.0)
+GRADE_WINDOW_M = 10.0
+
+def grade_window_start(distance: np.ndarray, window_m: float = GRADE_WINDOW_M) -> np.ndarray:
+    """
+    For every sample i, the last sample j with distance[j] <= distance[i] - window_m
+    (0 while less than window_m has been covered). `distance` must be non-decreasing.
+    """
+    j = np.searchsorted(distance, distance - window_m, side="right") - 1
+    return np.maximum(j, 0, out=j)
+
+def grade_kernel(distance: np.ndarray, altitude: np.ndarray, window_m: float = GRADE_WINDOW_M,
+                 out: np.ndarray = None) -> np.ndarray:
+    """
+    Grade over a trailing distance window in one vectorized pass.
+
+    Cumulative distance is the prefix sum of step lengths (made monotone with
+    a running max), so np.searchsorted finds each window start and both
+    deltas are endpoint differences: (alt[i] - alt[j]) / (dist[i] - dist[j]).
+    Zero-length windows (standing still) and missing data give 0; the result
+    is clipped to ±20 %. `out` may be a float32 buffer.
+    """
+    d = np.fmax.accumulate(np.asarray(distance, dtype=np.float64))
+    j = grade_window_start(d, window_m)
+    d_dist = d - d[j]
+    if out is None:
+        out = np.empty(len(d))
+    np.subtract(altitude, altitude[j], out=out, casting="same_kind")
+    flat = ~(d_dist > 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        np.divide(out, d_dist, out=out, where=~flat, casting="same_kind")
+    out[flat] = 0.0
+    np.nan_to_num(out, copy=False, nan=0.0)
+    return np.clip(out, -0.2, 0.2, out=out)
+
+def denoise_altitude(altitude: np.ndarray, kernel: int) -> np.ndarray:
+    """Running median over `kernel` samples (edges use the nearest value, not zeros)."""
+    from scipy.ndimage import median_filter
+    return median_filter(altitude, size=kernel, mode="nearest")
+
+@tracing.traced()
+def compute_grade(df: pd.DataFrame, window_m: float = GRADE_WINDOW_M, denoise: int = 0) -> pd.DataFrame:
+    """grade over a trailing `window_m` metres of distance; denoise=k median-filters altitude first."""
+    alt = df["altitude"].to_numpy(dtype=float)
+    if denoise > 1:
+        alt = denoise_altitude(alt, denoise)
+    df["grade"] = grade_kernel(df["distance"].to_numpy(dtype=float), alt, window_m)
     return df
 
-def v_flat_from_grade(v: np.ndarray, grade: np.ndarray, k: float=6.0) -> np.ndarray:
+def v_flat_from_grade(v: np.ndarray, grade: np.ndarray, k: float=6.0, out: np.ndarray=None) -> np.ndarray:
     k_down = 0.6*k
     denom = np.where(grade>=0, 1 + k*grade, 1 + k_down*grade)
-    denom = np.clip(denom, 0.5, 1.5)
-    return np.divide(v, denom)
+    denom = np.clip(denom, 0.5, 1.5, out=denom)
+    return np.divide(v, denom, out=out)
 
-def bin30(df: pd.DataFrame) -> pd.DataFrame:
-    df2 = df.copy()
-    df2["v_flat"] = v_flat_from_grade(df2["v"].values, df2["grade"].values)
-    df2["valid_v"] = (df2["v"].between(0,10)).astype(int)
-    df2["valid_hr"] = (df2["hr"].between(35,220)).astype(int)
-    df2["valid_flat"] = 1
+def _group_starts(keys: np.ndarray) -> np.ndarray:
+    """Start offsets of runs of equal values in sorted `keys`."""
+    if len(keys) == 0:
+        return np.zeros(0, dtype=np.intp)
+    return np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+
+def _nanmean_reduce(x: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """NaN-aware per-group mean (sum and count in one reduceat each)."""
+    ok = ~np.isnan(x)
+    tot = np.add.reduceat(np.where(ok, x, 0.0).astype(np.float64, copy=False), starts)
+    cnt = np.add.reduceat(ok, starts, dtype=np.int64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(cnt > 0, tot / np.maximum(cnt, 1), np.nan)
+
+@tracing.traced()
+def bin_arrays(t: np.ndarray, v: np.ndarray, grade: np.ndarray, hr: np.ndarray,
+               width: int = 30, v_flat: np.ndarray = None) -> pd.DataFrame:
+    """
+    Aggregate 1 Hz arrays into `width`-second bins.
+    Vectorized: groups are runs of the sorted `t // width` keys reduced with
+    np.add.reduceat, so there is no per-group Python call and no frame copy.
+    Missing values are NaN (pass a precomputed `v_flat` to skip recomputing it).
+    """
+    keys = (t // width).astype(np.int64)
+    if len(keys) > 1 and np.any(keys[1:] < keys[:-1]):
+        order = np.argsort(keys, kind="stable")
+        keys, v, grade, hr = keys[order], v[order], grade[order], hr[order]
+        v_flat = None if v_flat is None else v_flat[order]
+    starts = _group_starts(keys)
+    if len(starts) == 0:
+        return pd.DataFrame(columns=["bin","seconds","v_kmh","vflat_kmh","hr_bpm","grade","coverage",
+                                     "f_v","f_hr","f_flat","is_move","valid_bin"])
+    counts = np.diff(np.r_[starts, len(keys)])
+
+    if v_flat is None:
+        v_flat = v_flat_from_grade(v, grade)
+    valid_v = (v >= 0) & (v <= 10)
+    valid_hr = (hr >= 35) & (hr <= 220)
     # drop low speeds from load calc
-    df2["is_move"] = (df2["v"]*3.6 >= 1.0).astype(int)
-    # 30s bins
-    df2["bin"] = (df2["t"] // 30).astype(int)
-    agg = df2.groupby("bin").agg(
-        seconds=("t","count"),
-        v_kmh=("v", lambda x: 3.6*np.nanmean(x)),
-        vflat_kmh=("v_flat", lambda x: 3.6*np.nanmean(x)),
-        hr_bpm=("hr","mean"),
-        grade=("grade","mean"),
-        coverage=("valid_v","mean"),
-        f_v=("valid_v","mean"),
-        f_hr=("valid_hr","mean"),
-        f_flat=("valid_flat","mean"),
-        is_move=("is_move","mean"),
-    ).reset_index()
+    is_move = v*3.6 >= 1.0
+    f_v = np.add.reduceat(valid_v, starts, dtype=np.int64) / counts
+
+    agg = pd.DataFrame({
+        "bin": keys[starts],
+        "seconds": counts.astype(np.int64),
+        "v_kmh": 3.6*_nanmean_reduce(v, starts),
+        "vflat_kmh": 3.6*_nanmean_reduce(v_flat, starts),
+        "hr_bpm": _nanmean_reduce(hr, starts),
+        "grade": _nanmean_reduce(grade, starts),
+        "coverage": f_v,
+        "f_v": f_v,
+        "f_hr": np.add.reduceat(valid_hr, starts, dtype=np.int64) / counts,
+        "f_flat": np.ones(len(starts)),
+        "is_move": np.add.reduceat(is_move, starts, dtype=np.int64) / counts,
+    })
     # quality filters
     agg["valid_bin"] = (agg["coverage"]>=0.5) & (agg["v_kmh"]>=1.0)
     return agg
 
+def bin_frame(df: pd.DataFrame, width: int = 30) -> pd.DataFrame:
+    """Aggregate a 1 Hz frame into `width`-second bins (see bin_arrays)."""
+    return bin_arrays(df["t"].to_numpy(), df["v"].to_numpy(dtype=float),
+                      df["grade"].to_numpy(dtype=float), df["hr"].to_numpy(dtype=float), width)
+
+def bin30(df: pd.DataFrame) -> pd.DataFrame:
+    return bin_frame(df, 30)
+
+DEFAULT_ZONES = {
+    "Z1": (0.60, 0.80),
+    "Z2": (0.80, 0.90),
+    "Z3": (0.90, 1.00),
+    "Z4": (1.00, 1.05),
+    "Z5": (1.05, 1.20),
+}
+
+def zones_from_config(app: Dict[str, Any]) -> Dict[str, Tuple[float,float]]:
+    """Zone bounds (fractions of CS) from the [app] secrets, z1_low .. z5_high."""
+    return {z: (app.get(f"{z.lower()}_low", lo), app.get(f"{z.lower()}_high", hi))
+            for z, (lo, hi) in DEFAULT_ZONES.items()}
+
+@lru_cache(maxsize=32)
+def _compile_zones(items: Tuple[Tuple[str, Tuple[float, float]], ...]) -> Tuple[np.ndarray, np.ndarray]:
+    zones = dict(items)
+    first_lo = next(iter(zones.values()))[0]
+    points = np.array(sorted({float(x) for lo_hi in zones.values() for x in lo_hi}))
+    labels = ["Z0"]
+    for lo, hi in zip(points[:-1], points[1:]):
+        label = next((z for z, (zlo, zhi) in zones.items() if zlo <= lo and hi <= zhi), None)
+        labels.append(label or ("Z0" if hi <= first_lo else "Z6"))
+    labels.append("Z6")
+    labels.append("NA")  # slot for NaN speed / invalid CS
+    return points, np.array(labels, dtype=object)
+
+def compile_zones(zones: Dict[str, Tuple[float,float]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compile a {label: (lo, hi)} %CS zone dict into sorted edges plus one label
+    per interval, so `np.searchsorted(edges, r, side="right")` indexes `labels`
+    directly. Uncovered ratios map to Z0 below the first zone and Z6 otherwise
+    (same rules as the per-bin classifier); the last label is "NA".
+    Compiled once per distinct zone config.
+    """
+    return _compile_zones(tuple((k, (float(lo), float(hi))) for k, (lo, hi) in zones.items()))
+
+def _zone_index(vflat_kmh: np.ndarray, cs_kmh: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    with np.errstate(invalid="ignore", divide="ignore"):
+        r = vflat_kmh / cs_kmh
+    idx = np.searchsorted(edges, r, side="right")
+    idx[np.isnan(r) | ~(np.broadcast_to(cs_kmh, r.shape) > 0)] = len(edges) + 1
+    return idx
+
+def classify_zones(vflat_kmh: np.ndarray, cs_kmh: float, zones: Dict[str, Tuple[float,float]]) -> np.ndarray:
+    """Vectorized classify_zone: zone labels for a whole array of speeds."""
+    edges, labels = compile_zones(zones)
+    return labels[_zone_index(np.asarray(vflat_kmh, dtype=float), np.float64(cs_kmh), edges)]
+
 def classify_zone(vflat_kmh: float, cs_kmh: float, zones: Dict[str, Tuple[float,float]]) -> str:
-    if np.isnan(vflat_kmh) or cs_kmh<=0:
-        return "NA"
-    r = vflat_kmh / cs_kmh
-    for label, (lo,hi) in zones.items():
-        if lo <= r < hi:
-            return label
-    if r < list(zones.values())[0][0]:
-        return "Z0"
-    return "Z6"
+    return str(classify_zones(np.array([vflat_kmh]), cs_kmh, zones)[0])
+
+@tracing.traced()
+def zone_time_matrix(vflat_kmh: np.ndarray, seconds: np.ndarray, cs_values,
+                     zones: Dict[str, Tuple[float,float]]) -> pd.DataFrame:
+    """
+    Time (s) per zone for every CS in `cs_values` in one broadcasted pass.
+    Rows are CS values (km/h), columns zone labels, e.g. a sweep of
+    np.arange(11.5, 13.01, 0.1) over every valid bin of an athlete's history.
+    """
+    edges, labels = compile_zones(zones)
+    cs = np.atleast_1d(np.asarray(cs_values, dtype=float))
+    v = np.asarray(vflat_kmh, dtype=float)
+    w = np.asarray(seconds, dtype=float)
+    n_lab = len(labels)
+    idx = _zone_index(v[None, :], cs[:, None], edges)
+    flat = (idx + n_lab*np.arange(len(cs))[:, None]).ravel()
+    m = np.bincount(flat, weights=np.broadcast_to(w, idx.shape).ravel(),
+                    minlength=n_lab*len(cs)).reshape(len(cs), n_lab)
+    # labels can repeat (Z0/Z6 around gaps) -> merge columns
+    uniq = list(dict.fromkeys(labels))
+    cols = {lab: m[:, labels == lab].sum(axis=1) for lab in uniq}
+    out = pd.DataFrame(cols, index=pd.Index(cs, name="cs_kmh"))
+    return out[[c for c in ["Z0", *zones.keys(), "Z6", "NA"] if c in out.columns]]
 
+@tracing.traced()
 def zone_table(bins: pd.DataFrame, cs_kmh: float, zones: Dict[str, Tuple[float,float]]) -> pd.DataFrame:
     df = bins[bins["valid_bin"]].copy()
     if df.empty:
         return pd.DataFrame(columns=["zone","time_s","vflat_avg_kmh","hr_avg_bpm","load_km","IF_v"])
-    df["zone"] = [classify_zone(v, cs_kmh, zones) for v in df["vflat_kmh"].values]
+    df["zone"] = classify_zones(df["vflat_kmh"].to_numpy(dtype=float), cs_kmh, zones)
     out = df.groupby("zone").agg(
         time_s=("seconds","sum"),
         vflat_avg_kmh=("vflat_kmh","mean"),
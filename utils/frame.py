@@ -0,0 +1,150 @@
+from typing import Any, Dict
+import numpy as np
+import pandas as pd
+
+try:
+    from utils import etl
+    from utils import tracing
+except ModuleNotFoundError:
+    import etl      # type: ignore
+    import tracing  # type: ignore
+
+HR_MISSING = 0  # uint8 sentinel for "no heart-rate sample"
+
+
+class ActivityFrame:
+    """
+    Compact 1 Hz activity for the ETL hot path: one contiguous NumPy array per
+    channel instead of a float64 DataFrame that gets copied at every stage.
+
+    t         uint32   seconds (full 1 s grid)
+    distance  float64  m (cumulative; float32 would lose cm over an ultra)
+    v         float32  m/s, NaN where the speed stream has no sample
+    altitude  float32  m
+    hr        uint8    bpm, HR_MISSING (0) where unknown
+    grade     float32  filled in place by compute_grade()
+    v_flat    float32  filled in place by compute_v_flat()
+
+    Same rules as etl.resample_to_1hz / compute_grade / bin30; `to_frame()`
+    converts back to the DataFrame shape the rest of the app uses.
+    """
+    __slots__ = ("t", "distance", "v", "altitude", "hr", "grade", "v_flat")
+
+    def __init__(self, t, distance, v, altitude, hr):
+        self.t = t
+        self.distance = distance
+        self.v = v
+        self.altitude = altitude
+        self.hr = hr
+        self.grade = np.zeros(len(t), dtype=np.float32)
+        self.v_flat = np.empty(len(t), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.t)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, k).nbytes for k in self.__slots__)
+
+    # ---------- build ----------
+    @classmethod
+    @tracing.traced("frame.from_streams")
+    def from_streams(cls, streams: Dict[str, Any]) -> "ActivityFrame":
+        """Resample Strava key_by_type streams onto a 1 s grid (see etl.resample_to_1hz)."""
+        t_raw = np.asarray(streams.get("time", {}).get("data", []), dtype=np.int64)
+        if len(t_raw) == 0:
+            raise ValueError("No time stream")
+        order = None
+        if np.any(t_raw[1:] < t_raw[:-1]):
+            order = np.argsort(t_raw, kind="stable")
+            t_raw = t_raw[order]
+
+        def raw(key):
+            s = streams.get(key)
+            if not isinstance(s, dict) or s.get("data") is None or len(s["data"]) == 0:
+                return None
+            x = np.asarray(s["data"], dtype=np.float64)
+            return x if order is None else x[order]
+
+        t0 = t_raw[0]
+        n = int(t_raw[-1] - t0 + 1)
+        pos = t_raw - t0
+        grid = np.arange(n, dtype=np.float64)
+
+        def interp(x):
+            ok = ~np.isnan(x)
+            if not ok.any():
+                return np.full(n, np.nan)
+            return np.interp(grid, pos[ok].astype(np.float64), x[ok])
+
+        d_raw = raw("distance")
+        if d_raw is None:
+            raise ValueError("No distance stream")
+        distance = interp(d_raw)
+        del d_raw
+
+        v = np.full(n, np.nan, dtype=np.float32)
+        vel = raw("velocity_smooth")
+        if vel is not None and not np.isnan(vel).all():
+            v[pos] = vel
+        else:
+            v[0] = 0.0
+            np.subtract(distance[1:], distance[:-1], out=v[1:], casting="same_kind")
+        np.clip(v, 0, 10, out=v)
+        del vel
+
+        alt_raw = raw("altitude")
+        altitude = (interp(alt_raw) if alt_raw is not None else np.full(n, np.nan)).astype(np.float32)
+        del alt_raw, grid
+
+        hr = np.zeros(n, dtype=np.uint8)
+        hr_raw = raw("heartrate")
+        if hr_raw is not None:
+            full = np.full(n, np.nan, dtype=np.float32)
+            full[pos] = hr_raw
+            # forward fill: index of the last known sample at or before each second
+            idx = np.arange(n, dtype=np.int32)
+            idx[np.isnan(full)] = -1
+            np.maximum.accumulate(idx, out=idx)
+            known = idx >= 0
+            hr[known] = np.clip(np.rint(full[idx[known]]), 35, 220)
+
+        return cls(np.arange(t0, t0 + n, dtype=np.uint32), distance, v, altitude, hr)
+
+    # ---------- derived channels (in place) ----------
+    @tracing.traced("frame.compute_grade", rows=False)
+    def compute_grade(self, window_m: float = etl.GRADE_WINDOW_M, denoise: int = 0) -> "ActivityFrame":
+        """Distance-window grade (etl.grade_kernel) written into self.grade."""
+        if len(self) == 0:
+            return self
+        alt = etl.denoise_altitude(self.altitude, denoise) if denoise > 1 else self.altitude
+        etl.grade_kernel(self.distance, alt, window_m, out=self.grade)
+        return self
+
+    def compute_v_flat(self, k: float = 6.0) -> "ActivityFrame":
+        etl.v_flat_from_grade(self.v, self.grade, k=k, out=self.v_flat)
+        return self
+
+    def hr_float(self) -> np.ndarray:
+        out = self.hr.astype(np.float32)
+        out[self.hr == HR_MISSING] = np.nan
+        return out
+
+    # ---------- outputs ----------
+    @tracing.traced("frame.bins")
+    def bins(self, width: int = 30) -> pd.DataFrame:
+        """Same columns as etl.bin30 (grade/v_flat must be computed first)."""
+        self.compute_v_flat()
+        return etl.bin_arrays(self.t, self.v, self.grade, self.hr_float(), width, v_flat=self.v_flat)
+
+    def to_frame(self, compact: bool = False) -> pd.DataFrame:
+        """
+        DataFrame view. compact=True keeps the small dtypes (hr uint8 with 0 =
+        missing); otherwise columns match etl.resample_to_1hz + compute_grade.
+        """
+        if compact:
+            return pd.DataFrame({"t": self.t, "distance": self.distance, "altitude": self.altitude,
+                                 "hr": self.hr, "v": self.v, "grade": self.grade})
+        return pd.DataFrame({"t": self.t.astype(np.int64), "distance": self.distance,
+                             "altitude": self.altitude.astype(np.float64), "hr": self.hr_float().astype(np.float64),
+                             "v": self.v.astype(np.float64), "grade": self.grade.astype(np.float64)})
@@ -0,0 +1,88 @@
+"""
+Indexed ideal-curve lookups.
+
+The ideal CSV (distance_km, time_min[, speed_kmh]) is cleaned once into a
+monotone envelope: for every duration, the best speed held for at least that
+long (a reverse running max over time), deduplicated so that speed strictly
+decreases as time grows (speeds are rounded first, so float noise from
+distance/time does not keep dominated near-duplicates). The envelope is saved
+next to the CSV as `<csv>.<sha>.npy` (sha = hash of the CSV bytes and the
+rounding, so editing or replacing the file invalidates it) and memory-mapped
+on later loads. Queries are
+vectorized np.interp calls, O(log n) per point.
+"""
+import os, glob, hashlib
+from typing import Tuple
+import numpy as np
+import pandas as pd
+
+SPEED_DECIMALS = 6   # km/h; rounding before the running max / dedupe
+
+
+def _file_hash(path: str, salt: str = "") -> str:
+    h = hashlib.sha256(salt.encode())
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()[:16]
+
+
+def monotone_envelope(speed_kmh: np.ndarray, time_min: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Clean raw (speed, time) points; returns (speed ascending, time descending)."""
+    speed_kmh = np.asarray(speed_kmh, dtype=float)
+    time_min = np.asarray(time_min, dtype=float)
+    ok = np.isfinite(speed_kmh) & np.isfinite(time_min) & (speed_kmh > 0) & (time_min > 0)
+    s, t = np.round(speed_kmh[ok], SPEED_DECIMALS), time_min[ok]
+    order = np.lexsort((-s, t))                      # time asc, fastest first on ties
+    s, t = s[order], t[order]
+    s = np.maximum.accumulate(s[::-1])[::-1]         # can hold v for t -> can hold it for less
+    last = np.r_[s[1:] != s[:-1], True]              # per speed keep the longest time
+    s, t = s[last], t[last]
+    return s[::-1].copy(), t[::-1].copy()
+
+
+def _read_csv(path: str) -> Tuple[np.ndarray, np.ndarray]:
+    df = pd.read_csv(path)
+    if "speed_kmh" not in df.columns and {"distance_km", "time_min"}.issubset(df.columns):
+        df["speed_kmh"] = 60.0 * df["distance_km"] / df["time_min"]
+    return df["speed_kmh"].to_numpy(dtype=float), df["time_min"].to_numpy(dtype=float)
+
+
+class IdealCurve:
+    def __init__(self, speed_kmh: np.ndarray, time_min: np.ndarray):
+        self.speed_kmh = speed_kmh   # strictly increasing
+        self.time_min = time_min     # strictly decreasing
+
+    @classmethod
+    def from_csv(cls, path: str) -> "IdealCurve":
+        """Load through the hash-keyed .npy sidecar, rebuilding it if the CSV changed."""
+        digest = _file_hash(path, salt=f"envelope:{SPEED_DECIMALS}")
+        sidecar = f"{path}.{digest}.npy"
+        if os.path.exists(sidecar):
+            arr = np.load(sidecar, mmap_mode="r")
+            return cls(arr[0], arr[1])
+        arr = np.vstack(monotone_envelope(*_read_csv(path)))
+        try:
+            for stale in glob.glob(f"{glob.escape(path)}.*.npy"):
+                os.remove(stale)
+            tmp = f"{sidecar}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, arr)
+            os.replace(tmp, sidecar)
+        except OSError:
+            pass  # read-only deploy: keep the in-memory envelope
+        return cls(arr[0], arr[1])
+
+    def __len__(self) -> int:
+        return len(self.speed_kmh)
+
+    def time_for_speed(self, v_kmh) -> np.ndarray:
+        """Ideal time (min) at each speed; clamped to the table's range."""
+        return np.interp(np.asarray(v_kmh, dtype=float), self.speed_kmh, self.time_min)
+
+    def speed_for_time(self, t_min) -> np.ndarray:
+        """Ideal speed (km/h) that can be held for each duration; clamped to the table's range."""
+        return np.interp(np.asarray(t_min, dtype=float), self.time_min[::-1], self.speed_kmh[::-1])
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame({"speed_kmh": np.asarray(self.speed_kmh), "time_min": np.asarray(self.time_min)})
@@ -0,0 +1,235 @@
+"""
+Durable local job queue (SQLite) for background ingestion.
+
+    q = JobQueue()                       # ONFLOWS_QUEUE or .cache/jobs.sqlite
+    q.enqueue("sync_user", {"user_id": uid}, dedupe_key=f"sync:{uid}")
+    job = q.claim()                      # -> dict or None
+    q.complete(job["id"], result) / q.fail(job["id"], "error text")
+
+- dedupe: at most one *queued* job per dedupe_key; enqueueing a duplicate
+  returns the existing job id. A job may be queued while an identical one
+  runs, so a change that arrives mid-run is not lost.
+- serial_key: jobs sharing it never run at the same time (e.g. all writes
+  of one user), whatever the worker concurrency.
+- retries: a failed job is re-queued with exponential backoff until
+  max_attempts, then stays "failed" with its last error. defer() re-queues
+  for a fixed time without spending an attempt (Strava's daily limit).
+- crash safety: claiming is one transaction; jobs left "running" by a dead
+  worker are re-queued by requeue_stale().
+
+Each call opens its own connection, so one JobQueue can be shared by threads
+and the app and the worker can use the same file from different processes.
+"""
+import os, json, time, sqlite3
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+DEFAULT_PATH = os.environ.get("ONFLOWS_QUEUE", os.path.join(".cache", "jobs.sqlite"))
+MAX_ATTEMPTS = 5
+BACKOFF_S = 30.0
+STALE_S = 15 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind         TEXT    NOT NULL,
+    payload      TEXT    NOT NULL,
+    dedupe_key   TEXT,
+    serial_key   TEXT,
+    status       TEXT    NOT NULL DEFAULT 'queued',   -- queued | running | done | failed
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    run_after    REAL    NOT NULL,
+    error        TEXT,
+    result       TEXT,
+    created_at   REAL    NOT NULL,
+    updated_at   REAL    NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS jobs_dedupe ON jobs(dedupe_key) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs(status, run_after);
+CREATE INDEX IF NOT EXISTS jobs_key ON jobs(dedupe_key, status);
+CREATE TABLE IF NOT EXISTS state (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def _row(r: sqlite3.Row) -> Dict[str, Any]:
+    d = dict(r)
+    d["payload"] = json.loads(d["payload"])
+    d["result"] = json.loads(d["result"]) if d.get("result") else None
+    return d
+
+
+class JobQueue:
+    def __init__(self, path: str = DEFAULT_PATH, clock=time.time):
+        self.path = path
+        self.clock = clock
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        con = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        con.row_factory = sqlite3.Row
+        try:
+            yield con
+        finally:
+            con.close()
+
+    @contextmanager
+    def _tx(self):
+        """Write transaction taken up front, so concurrent claimers serialize."""
+        with self._connect() as con:
+            con.execute("BEGIN IMMEDIATE")
+            try:
+                yield con
+            except BaseException:
+                con.execute("ROLLBACK")
+                raise
+            con.execute("COMMIT")
+
+    # ---------- producers ----------
+    def enqueue(self, kind: str, payload: Dict[str, Any], dedupe_key: Optional[str] = None,
+                serial_key: Optional[str] = None, delay_s: float = 0.0,
+                max_attempts: int = MAX_ATTEMPTS) -> int:
+        """Queue a job; returns its id (or the id of the queued duplicate)."""
+        now = self.clock()
+        with self._tx() as con:
+            cur = con.execute(
+                "INSERT OR IGNORE INTO jobs (kind, payload, dedupe_key, serial_key, max_attempts, "
+                "run_after, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (kind, json.dumps(payload), dedupe_key, serial_key, max_attempts, now + delay_s, now, now))
+            if cur.rowcount:
+                return cur.lastrowid
+            return con.execute("SELECT id FROM jobs WHERE dedupe_key = ? AND status = 'queued'",
+                               (dedupe_key,)).fetchone()["id"]
+
+    # ---------- consumers ----------
+    def claim(self, kinds: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """Take the oldest runnable job (marks it running) or return None."""
+        now = self.clock()
+        where = ["status = 'queued'", "run_after <= ?",
+                 "(serial_key IS NULL OR serial_key NOT IN "
+                 "(SELECT serial_key FROM jobs WHERE status = 'running' AND serial_key IS NOT NULL))"]
+        args: List[Any] = [now]
+        if kinds:
+            where.append(f"kind IN ({','.join('?' * len(kinds))})")
+            args += list(kinds)
+        with self._tx() as con:
+            r = con.execute(f"SELECT * FROM jobs WHERE {' AND '.join(where)} ORDER BY run_after, id LIMIT 1",
+                            args).fetchone()
+            if r is None:
+                return None
+            con.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ? "
+                        "WHERE id = ?", (now, r["id"]))
+        job = _row(r)
+        job["status"], job["attempts"] = "running", job["attempts"] + 1
+        return job
+
+    def complete(self, job_id: int, result: Any = None):
+        with self._tx() as con:
+            con.execute("UPDATE jobs SET status = 'done', result = ?, error = NULL, updated_at = ? WHERE id = ?",
+                        (json.dumps(result), self.clock(), job_id))
+
+    def fail(self, job_id: int, error: str, retry: bool = True) -> str:
+        """Record a failure; re-queue with backoff while attempts remain. Returns the new status."""
+        now = self.clock()
+        with self._tx() as con:
+            r = con.execute("SELECT attempts, max_attempts, dedupe_key FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            again = retry and r["attempts"] < r["max_attempts"]
+            if again and r["dedupe_key"] is not None:
+                # a fresh duplicate was queued meanwhile: that one will do the work
+                dup = con.execute("SELECT 1 FROM jobs WHERE dedupe_key = ? AND status = 'queued'",
+                                  (r["dedupe_key"],)).fetchone()
+                again = dup is None
+            status = "queued" if again else "failed"
+            run_after = now + BACKOFF_S * 2 ** (r["attempts"] - 1) if again else now
+            con.execute("UPDATE jobs SET status = ?, error = ?, run_after = ?, updated_at = ? WHERE id = ?",
+                        (status, error, run_after, now, job_id))
+        return status
+
+    def defer(self, job_id: int, run_after: float, error: str) -> str:
+        """
+        Re-queue a job to run at `run_after` without spending an attempt (e.g. a
+        rate limit that resets at a known time). Returns the new status.
+        """
+        now = self.clock()
+        with self._tx() as con:
+            r = con.execute("SELECT dedupe_key FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            dup = r["dedupe_key"] is not None and con.execute(
+                "SELECT 1 FROM jobs WHERE dedupe_key = ? AND status = 'queued'", (r["dedupe_key"],)).fetchone()
+            status = "failed" if dup else "queued"
+            con.execute("UPDATE jobs SET status = ?, attempts = MAX(attempts - 1, 0), error = ?, run_after = ?, "
+                        "updated_at = ? WHERE id = ?", (status, error, run_after if not dup else now, now, job_id))
+        return status
+
+    def touch(self, job_ids: List[int]):
+        """Heartbeat for long-running jobs, so requeue_stale leaves them alone."""
+        if not job_ids:
+            return
+        with self._tx() as con:
+            con.execute(f"UPDATE jobs SET updated_at = ? WHERE status = 'running' AND id IN "
+                        f"({','.join('?' * len(job_ids))})", [self.clock(), *job_ids])
+
+    def requeue_stale(self, older_than_s: float = STALE_S) -> int:
+        """Put jobs left running by a dead worker back in the queue."""
+        now = self.clock()
+        with self._tx() as con:
+            stale = con.execute("SELECT id, dedupe_key FROM jobs WHERE status = 'running' AND updated_at < ?",
+                                (now - older_than_s,)).fetchall()
+            n = 0
+            for r in stale:
+                dup = r["dedupe_key"] is not None and con.execute(
+                    "SELECT 1 FROM jobs WHERE dedupe_key = ? AND status = 'queued'", (r["dedupe_key"],)).fetchone()
+                status = "failed" if dup else "queued"
+                con.execute("UPDATE jobs SET status = ?, error = 'worker lost', run_after = ?, updated_at = ? "
+                            "WHERE id = ?", (status, now, now, r["id"]))
+                n += status == "queued"
+        return n
+
+    # ---------- reads ----------
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        with self._connect() as con:
+            r = con.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _row(r) if r else None
+
+    def latest(self, dedupe_key: str) -> Optional[Dict[str, Any]]:
+        """Most recent job with this key (any status)."""
+        with self._connect() as con:
+            r = con.execute("SELECT * FROM jobs WHERE dedupe_key = ? ORDER BY id DESC LIMIT 1",
+                            (dedupe_key,)).fetchone()
+        return _row(r) if r else None
+
+    def latest_result(self, dedupe_key: str) -> Optional[Any]:
+        """Result of the most recent finished job with this key, or None."""
+        with self._connect() as con:
+            r = con.execute("SELECT result FROM jobs WHERE dedupe_key = ? AND status = 'done' "
+                            "ORDER BY id DESC LIMIT 1", (dedupe_key,)).fetchone()
+        return json.loads(r["result"]) if r and r["result"] else None
+
+    def counts(self) -> Dict[str, int]:
+        with self._connect() as con:
+            rows = con.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {r["status"]: r["n"] for r in rows}
+
+    def purge(self, older_than_s: float = 7 * 86400) -> int:
+        """Delete finished/failed jobs older than the cutoff."""
+        with self._tx() as con:
+            return con.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                               (self.clock() - older_than_s,)).rowcount
+
+    # ---------- small key/value state (e.g. per-user season-best curve) ----------
+    def get_state(self, key: str, default: Any = None) -> Any:
+        with self._connect() as con:
+            r = con.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return json.loads(r["value"]) if r else default
+
+    def set_state(self, key: str, value: Any):
+        with self._tx() as con:
+            con.execute("INSERT INTO state (key, value) VALUES (?, ?) "
+                        "ON CONFLICT(key) DO UPDATE SET value = excluded.value", (key, json.dumps(value)))
@@ -0,0 +1,220 @@
+"""
+Local embedded storage backend (SQLite) with the same table operations as the
+Supabase backend in utils.db, plus bulk DataFrame appends and SQL analytics.
+
+    ONFLOWS_DB=sqlite:///data/onflows.sqlite   # or [storage] url = "..." in secrets
+
+Tables are created on first write from the row keys (SQLite column affinity,
+so no schema file is needed); columns that appear later are added, and
+upserts get a unique index on their conflict columns. dict/list values are
+stored as JSON text, booleans as 0/1, NaN as NULL.
+
+The store is for single-machine use (offline runs, tests, backfills and
+history analytics): WAL mode lets the app read while a worker writes, and
+append_frame() writes one transaction per chunk.
+"""
+import os, json, math, sqlite3, threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+import numpy as np
+import pandas as pd
+
+try:
+    from utils import tracing
+except ModuleNotFoundError:
+    import tracing  # type: ignore
+
+OPS = {"eq": "=", "gte": ">=", "gt": ">", "lte": "<=", "lt": "<"}
+
+
+def _q(name: str) -> str:
+    """Quote an identifier."""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _insert_sql(table: str, cols: Sequence[str], key: Sequence[str] = ()) -> str:
+    """INSERT for `cols`; with `key`, an upsert on that (unique-indexed) key."""
+    sql = f"INSERT INTO {_q(table)} ({', '.join(map(_q, cols))}) VALUES ({', '.join('?' * len(cols))})"
+    if key:
+        rest = [c for c in cols if c not in key]
+        sql += f" ON CONFLICT ({', '.join(map(_q, key))}) DO "
+        sql += ("UPDATE SET " + ", ".join(f"{_q(c)} = excluded.{_q(c)}" for c in rest)) if rest else "NOTHING"
+    return sql
+
+
+def _adapt(v: Any) -> Any:
+    if v is None or isinstance(v, (str, int, bytes)):
+        return v
+    if isinstance(v, float):
+        return None if math.isnan(v) else v
+    if isinstance(v, (dict, list, tuple)):
+        return json.dumps(v, default=str)
+    if isinstance(v, np.generic):
+        return _adapt(v.item())
+    if isinstance(v, (pd.Timestamp,)) or hasattr(v, "isoformat"):
+        return v.isoformat()
+    return v
+
+
+def _column_values(col: pd.Series) -> list:
+    """Column as a list of sqlite-native values (NaN/NaT -> None, bool -> 0/1)."""
+    if col.dtype.kind == "f":
+        vals = col.to_numpy()
+        out = vals.tolist()
+        if np.isnan(vals).any():
+            for j in np.flatnonzero(np.isnan(vals)).tolist():
+                out[j] = None
+        return out
+    if col.dtype.kind in "iub":
+        return col.to_numpy().astype(np.int64).tolist()
+    return [_adapt(v) for v in col.where(col.notna(), None).tolist()]
+
+
+class SQLiteStore:
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._columns: Dict[str, List[str]] = {}
+        self._indexes = set()
+
+    @property
+    def con(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            con.row_factory = sqlite3.Row
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con = con
+        return con
+
+    # ---------- schema ----------
+    def columns(self, table: str) -> List[str]:
+        cols = self._columns.get(table)
+        if cols is None:
+            cols = [r["name"] for r in self.con.execute(f"PRAGMA table_info({_q(table)})")]
+            if cols:
+                self._columns[table] = cols
+        return cols or []
+
+    def _check_columns(self, table: str, names: Iterable[str]):
+        """Raise on names that are not columns of `table` (SQLite would read them as string literals)."""
+        unknown = sorted(set(names) - set(self.columns(table)))
+        if unknown:
+            self._columns.pop(table, None)  # another process may have added them
+            unknown = sorted(set(unknown) - set(self.columns(table)))
+        if unknown:
+            raise ValueError(f"unknown column(s) {', '.join(unknown)} in table {table}")
+
+    def _ensure(self, table: str, cols: Sequence[str], key: Sequence[str] = ()):
+        with self._schema_lock:
+            have = self.columns(table)
+            if not have:
+                self.con.execute(f"CREATE TABLE IF NOT EXISTS {_q(table)} ({', '.join(map(_q, cols))})")
+            else:
+                for c in cols:
+                    if c not in have:
+                        self.con.execute(f"ALTER TABLE {_q(table)} ADD COLUMN {_q(c)}")
+            self.con.commit()
+            self._columns.pop(table, None)
+            if key:
+                self.create_index(table, key, unique=True)
+
+    def create_index(self, table: str, cols: Sequence[str], unique: bool = False):
+        name = f"{'ux' if unique else 'ix'}_{table}_{'_'.join(cols)}"
+        if name in self._indexes:
+            return
+        self.con.execute(f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {_q(name)} "
+                         f"ON {_q(table)} ({', '.join(map(_q, cols))})")
+        self.con.commit()
+        self._indexes.add(name)
+
+    # ---------- writes ----------
+    def _write(self, table: str, rows: List[Dict[str, Any]], key: Sequence[str] = ()) -> List[Dict[str, Any]]:
+        groups: Dict[tuple, List[Dict[str, Any]]] = {}
+        for r in rows:  # rows with the same key set share one statement
+            groups.setdefault(tuple(r), []).append(r)
+        with tracing.span("localstore.write", table=table) as sp:
+            for cols, grp in groups.items():
+                self._ensure(table, cols, key)
+                sql = _insert_sql(table, cols, key)
+                with self.con:
+                    self.con.executemany(sql, ([_adapt(r[c]) for c in cols] for r in grp))
+            sp.add(rows=len(rows))
+        return rows
+
+    def upsert(self, table: str, rows: List[Dict[str, Any]], on_conflict: str = "id", retries: int = 0):
+        return self._write(table, rows, tuple(on_conflict.split(",")))
+
+    def insert(self, table: str, rows: List[Dict[str, Any]], retries: int = 0):
+        return self._write(table, rows)
+
+    def delete_all(self, table: str):
+        if self.columns(table):
+            with self.con:
+                self.con.execute(f"DELETE FROM {_q(table)}")
+
+    def append_frame(self, table: str, df: pd.DataFrame, chunk_rows: int = 200_000,
+                     on_conflict: Optional[str] = None) -> int:
+        """
+        Bulk-append a DataFrame (columnar -> executemany per chunk); with
+        `on_conflict` ("a,b") rows replace existing ones with the same key.
+        Returns rows written.
+        """
+        if df.empty:
+            return 0
+        df = df.copy()
+        for c in df.columns:
+            if pd.api.types.is_datetime64_any_dtype(df[c]):  # UTC ISO text, as on the Supabase side
+                txt = np.datetime_as_string(df[c].to_numpy(dtype="datetime64[s]"), unit="s")
+                df[c] = np.where(df[c].isna(), None, txt)
+        cols = [str(c) for c in df.columns]
+        key = tuple(on_conflict.split(",")) if on_conflict else ()
+        self._ensure(table, cols, key)
+        sql = _insert_sql(table, cols, key)
+        with tracing.span("localstore.append_frame", table=table) as sp:
+            for i in range(0, len(df), chunk_rows):
+                part = df.iloc[i:i + chunk_rows]
+                with self.con:
+                    self.con.executemany(sql, zip(*(_column_values(part[c]) for c in part.columns)))
+            sp.add(rows=len(df))
+        return len(df)
+
+    # ---------- reads ----------
+    def select_page(self, table: str, columns: str, filters: Dict[str, Optional[Dict[str, Any]]],
+                    order_by: str, after: Any = None, limit: int = 1000) -> List[Dict[str, Any]]:
+        if not self.columns(table):
+            return []
+        names = [] if columns == "*" else [c.strip() for c in columns.split(",")]
+        self._check_columns(table, [*names, order_by, *(k for flt in filters.values() for k in (flt or {}))])
+        cols = "*" if columns == "*" else ", ".join(map(_q, names))
+        where, args = [], []
+        for op, flt in filters.items():
+            for k, v in (flt or {}).items():
+                if v is None and op == "eq":
+                    where.append(f"{_q(k)} IS NULL")
+                else:
+                    where.append(f"{_q(k)} {OPS[op]} ?")
+                    args.append(_adapt(v))
+        if after is not None:
+            where.append(f"{_q(order_by)} > ?")
+            args.append(_adapt(after))
+        sql = f"SELECT {cols} FROM {_q(table)}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {_q(order_by)} LIMIT {int(limit)}"
+        with tracing.span("localstore.select", table=table) as sp:
+            rows = [dict(r) for r in self.con.execute(sql, args)]
+            sp.add(rows=len(rows))
+        return rows
+
+    def query(self, sql: str, params: Iterable[Any] = ()) -> pd.DataFrame:
+        """Run an analytic SQL query; the result comes back as a DataFrame."""
+        with tracing.span("localstore.query") as sp:
+            df = pd.read_sql_query(sql, self.con, params=list(params))
+            sp.add(rows=len(df))
+        return df
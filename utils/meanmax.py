@@ -0,0 +1,79 @@
+from typing import List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+try:
+    from utils import tracing
+except ModuleNotFoundError:
+    import tracing  # type: ignore
+
+
+# ---------- duration grid ----------
+def duration_grid(min_s: int = 5, max_s: int = 4 * 3600, n: int = 48) -> np.ndarray:
+    """Log-spaced integer durations (s), deduplicated and ascending."""
+    return np.unique(np.round(np.geomspace(min_s, max_s, n)).astype(np.int64))
+
+
+DURATIONS = duration_grid()
+
+
+# ---------- per-activity curve ----------
+def mean_max_speed(v_mps: np.ndarray, durations: np.ndarray = DURATIONS) -> np.ndarray:
+    """
+    Best average speed (km/h) for every duration, from one 1 Hz speed array.
+
+    Uses prefix sums: the mean over [i, i+d) is (c[i+d] - c[i]) / d, so every
+    duration is one vectorized difference over the same cumulative array.
+    Windows touching a missing sample are skipped (like rolling(min_periods=d));
+    durations longer than the activity (or with no clean window) are NaN.
+    """
+    v = np.asarray(v_mps, dtype=float)
+    bad = np.isnan(v)
+    c = np.concatenate(([0.0], np.cumsum(np.where(bad, 0.0, v))))
+    nb = np.concatenate(([0], np.cumsum(bad)))
+    out = np.full(len(durations), np.nan)
+    for i, d in enumerate(durations):
+        if d > len(v):
+            break  # grid is ascending
+        sums = c[d:] - c[:-d]
+        sums[(nb[d:] - nb[:-d]) > 0] = -np.inf
+        best = sums.max()
+        if np.isfinite(best):
+            out[i] = 3.6 * best / d
+    return out
+
+
+@tracing.traced()
+def activity_curve(df: pd.DataFrame, activity_id=None, durations: np.ndarray = DURATIONS) -> pd.DataFrame:
+    """Mean-max curve of a 1 Hz ETL frame: columns duration_s, v_kmh, activity_id."""
+    return pd.DataFrame({
+        "duration_s": durations,
+        "v_kmh": mean_max_speed(df["v"].to_numpy(dtype=float), durations),
+        "activity_id": activity_id,
+    })
+
+
+# ---------- season best ----------
+def merge_best(season: Optional[pd.DataFrame], curve: pd.DataFrame) -> pd.DataFrame:
+    """
+    Fold one activity curve into the running season-best curve (same grid).
+    Only the new curve is touched, so history never needs to be rescanned.
+    """
+    if season is None or season.empty:
+        return curve.copy()
+    if not np.array_equal(season["duration_s"].to_numpy(), curve["duration_s"].to_numpy()):
+        raise ValueError("Mean-max curves must share the same duration grid")
+    old = season["v_kmh"].to_numpy(dtype=float)
+    new = curve["v_kmh"].to_numpy(dtype=float)
+    take = ~np.isnan(new) & (np.isnan(old) | (new > old))
+    out = season.copy()
+    out["v_kmh"] = np.where(take, new, old)
+    out["activity_id"] = np.where(take, curve["activity_id"].to_numpy(dtype=object),
+                                  season["activity_id"].to_numpy(dtype=object))
+    return out
+
+
+def cs_points(curve: pd.DataFrame, min_s: int = 180, max_s: int = 1800) -> List[Tuple[float, float]]:
+    """(T_sec, v_kmh) points in the CS/W′ fitting range for vts.estimate_cs_wprime."""
+    sel = curve[(curve["duration_s"] >= min_s) & (curve["duration_s"] <= max_s) & curve["v_kmh"].notna()]
+    return [(float(d), float(v)) for d, v in zip(sel["duration_s"], sel["v_kmh"])]
@@ -1,9 +1,26 @@
-import os, time, requests, streamlit as st
+import os, time, threading, requests, streamlit as st
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
 from urllib.parse import urlencode, urlparse, parse_qs
+from requests.adapters import HTTPAdapter
+
+try:
+    from utils import stream_store
+    from utils import streamjson
+    from utils import tracing
+except ModuleNotFoundError:
+    import stream_store        # type: ignore
+    import streamjson          # type: ignore
+    import tracing             # type: ignore
 
 OAUTH_AUTHORIZE = "https://www.strava.com/oauth/authorize"
 OAUTH_TOKEN = "https://www.strava.com/oauth/token"
-API_BASE = "https://www.strava.com/api/v3"
+# overridable so the fetcher can be pointed at a local stub server
+API_BASE = os.environ.get("STRAVA_API_BASE", "https://www.strava.com/api/v3")
+
+POOL_SIZE = 8          # max pooled connections (and max bulk workers)
+RETRIES = 4            # retries for 429 / 5xx
+BACKOFF_S = 1.0        # base for exponential backoff on 5xx
 
 SCOPES = ["read,activity:read_all"]
 
@@ -40,19 +57,218 @@ def refresh_token(refresh_token: str):
     r.raise_for_status()
     return r.json()
 
-def api_get(path: str, access_token: str, params=None):
+# ---------- HTTP session + rate limits ----------
+class RateLimitExceeded(RuntimeError):
+    """Raised when the daily Strava budget is used up (waiting would take hours)."""
+
+
+class RateLimiter:
+    """
+    Client-side scheduler for Strava's two budgets (15-min window and daily).
+
+    Limits/usage are learned from the `X-RateLimit-*` (or the stricter
+    `X-ReadRateLimit-*`) response headers. Every request reserves one unit
+    before it is sent, so concurrent workers never overshoot between header
+    updates. When the 15-min budget is within `safety` of the cap, callers
+    block until the next quarter hour (Strava windows reset at :00/:15/:30/:45
+    UTC); when the daily budget is exhausted, `RateLimitExceeded` is raised.
+    """
+    WINDOW_S = 15 * 60
+    DAY_S = 24 * 3600
+
+    def __init__(self, safety: int = 2, clock=time.time, sleep=time.sleep):
+        self.safety = safety
+        self.clock, self.sleep = clock, sleep
+        self.limit_15: Optional[int] = None
+        self.limit_day: Optional[int] = None
+        self.usage_15 = 0
+        self.usage_day = 0
+        self._window = self._day = None
+        self._lock = threading.Lock()
+
+    def _roll(self, now: float):
+        w, d = int(now // self.WINDOW_S), int(now // self.DAY_S)
+        if w != self._window:
+            self._window, self.usage_15 = w, 0
+        if d != self._day:
+            self._day, self.usage_day = d, 0
+
+    def acquire(self):
+        with self._lock:
+            self._roll(self.clock())
+            if self.limit_day is not None and self.usage_day >= self.limit_day - self.safety:
+                raise RateLimitExceeded(f"Strava daily limit reached ({self.usage_day}/{self.limit_day})")
+            if self.limit_15 is not None and self.usage_15 >= self.limit_15 - self.safety:
+                # hold the lock while waiting: every worker is throttled together
+                now = self.clock()
+                self.sleep(max((int(now // self.WINDOW_S) + 1) * self.WINDOW_S - now, 0) + 1)
+                self._roll(self.clock())
+            self.usage_15 += 1
+            self.usage_day += 1
+
+    def update(self, headers):
+        """Sync limits/usage from a response's headers."""
+        limit = headers.get("X-ReadRateLimit-Limit") or headers.get("X-RateLimit-Limit")
+        usage = headers.get("X-ReadRateLimit-Usage") or headers.get("X-RateLimit-Usage")
+        if not limit or not usage:
+            return
+        try:
+            l15, lday = (int(x) for x in limit.split(",")[:2])
+            u15, uday = (int(x) for x in usage.split(",")[:2])
+        except ValueError:
+            return
+        with self._lock:
+            self._roll(self.clock())
+            self.limit_15, self.limit_day = l15, lday
+            # local counts include in-flight reservations the server hasn't seen yet
+            self.usage_15 = max(self.usage_15, u15)
+            self.usage_day = max(self.usage_day, uday)
+
+    def exhaust_window(self) -> bool:
+        """Called on 429: treat the current 15-min window as spent (False if limits unknown)."""
+        with self._lock:
+            if self.limit_15 is None:
+                return False
+            self.usage_15 = max(self.usage_15, self.limit_15)
+            return True
+
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+default_limiter = RateLimiter()
+
+
+def get_session() -> requests.Session:
+    """One pooled keep-alive session per process."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=POOL_SIZE)
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            _session = s
+    return _session
+
+
+def _counted(chunks: Iterable[bytes], sp) -> Iterator[bytes]:
+    for chunk in chunks:
+        sp.add(bytes=len(chunk))
+        yield chunk
+
+def api_get(path: str, access_token: str, params=None, limiter: Optional[RateLimiter] = None,
+            retries: int = RETRIES, decode: Optional[Callable[[Iterable[bytes]], Any]] = None):
+    """
+    GET with rate-limit scheduling and retries on 429 / 5xx. With `decode`, a
+    successful body is handed to decode(chunks) as it downloads (e.g.
+    streamjson.decode_chunks) instead of being buffered for r.json().
+    """
+    limiter = limiter or default_limiter
     headers = {"Authorization": f"Bearer {access_token}"}
-    r = requests.get(f"{API_BASE}{path}", headers=headers, params=params or {}, timeout=30)
-    r.raise_for_status()
-    return r.json()
+    with tracing.span("strava.api_get", path=path) as sp:
+        for attempt in range(retries + 1):
+            limiter.acquire()
+            r = get_session().get(f"{API_BASE}{path}", headers=headers, params=params or {}, timeout=30,
+                                  stream=decode is not None)
+            limiter.update(r.headers)
+            streamed = decode is not None and r.status_code == 200
+            if not streamed:  # error bodies are small; reading them keeps the connection reusable
+                sp.add(bytes=len(r.content))
+            sp.add(status=r.status_code, attempts=attempt + 1)
+            if attempt < retries:
+                if r.status_code == 429:
+                    retry_after = r.headers.get("Retry-After")
+                    if retry_after and retry_after.isdigit():
+                        limiter.sleep(int(retry_after))
+                    elif not limiter.exhaust_window():
+                        limiter.sleep(BACKOFF_S * 2 ** attempt)
+                    continue
+                if r.status_code >= 500:
+                    limiter.sleep(BACKOFF_S * 2 ** attempt)
+                    continue
+            r.raise_for_status()
+            if streamed:
+                with r:
+                    data = decode(_counted(r.iter_content(streamjson.CHUNK_BYTES), sp))
+            else:
+                data = r.json()
+            if isinstance(data, list):
+                sp.add(rows=len(data))
+            return data
 
 def list_activities(access_token: str, after: int=None, per_page=30, page=1):
     params = {"per_page": per_page, "page": page}
-    if after:
+    if after is not None:
         params["after"] = after
     return api_get("/athlete/activities", access_token, params)
 
-def get_streams(activity_id: int, access_token: str):
+def iter_activity_pages(access_token: str, after: int = 0, per_page: int = 200):
+    """
+    Yield pages of activities started after `after` (epoch s) until exhausted.
+    With `after` set Strava returns activities oldest-first, so each page can
+    advance a sync watermark.
+    """
+    page = 1
+    while True:
+        acts = list_activities(access_token, after=after, per_page=per_page, page=page)
+        if not acts:
+            return
+        yield acts
+        if len(acts) < per_page:
+            return
+        page += 1
+
+@tracing.traced("strava.get_streams", rows=False)
+def get_streams(activity_id: int, access_token: str, limiter: Optional[RateLimiter] = None,
+                use_store: bool = True):
+    """Read-through the local stream store; only cache misses hit the network."""
+    store = stream_store.default_store() if use_store else None
+    if store is not None:
+        cached = store.get(activity_id)
+        if cached is not None:
+            return cached
     # distance, time, velocity_smooth, altitude, heartrate might not all be present
-    keys = "time,distance,velocity_smooth,altitude,heartrate"
-    return api_get(f"/activities/{activity_id}/streams", access_token, params={"keys": keys, "key_by_type": "true"})
+    keys = ",".join(stream_store.STREAM_KEYS)
+    # parsed while downloading, straight into ndarrays (no lists of boxed floats)
+    streams = api_get(f"/activities/{activity_id}/streams", access_token,
+                      params={"keys": keys, "key_by_type": "true"}, limiter=limiter,
+                      decode=streamjson.decode_chunks)
+    if store is not None:
+        store.put(activity_id, streams)
+    return streams
+
+def iter_streams(activity_ids: Iterable[int], access_token: str, max_workers: int = 4,
+                 limiter: Optional[RateLimiter] = None,
+                 return_exceptions: bool = False) -> Iterator[Tuple[int, Any]]:
+    """
+    Fetch streams for many activities over the pooled session with a bounded
+    thread pool. Yields (activity_id, streams) as each download completes.
+    With return_exceptions=True a failed activity yields (activity_id, exc)
+    instead of aborting the batch; RateLimitExceeded always propagates.
+    """
+    limiter = limiter or default_limiter
+    max_workers = max(1, min(max_workers, POOL_SIZE))
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(get_streams, aid, access_token, limiter): aid for aid in activity_ids}
+        try:
+            for fut in as_completed(futures):
+                aid = futures[fut]
+                try:
+                    yield aid, fut.result()
+                except RateLimitExceeded:
+                    raise
+                except Exception as e:
+                    if not return_exceptions:
+                        raise
+                    yield aid, e
+        finally:
+            for fut in futures:
+                fut.cancel()
+
+
+def get_streams_bulk(activity_ids: Iterable[int], access_token: str, max_workers: int = 4,
+                     limiter: Optional[RateLimiter] = None,
+                     return_exceptions: bool = False) -> Dict[int, Any]:
+    """Dict form of `iter_streams`: {activity_id: streams}."""
+    return dict(iter_streams(activity_ids, access_token, max_workers=max_workers,
+                             limiter=limiter, return_exceptions=return_exceptions))
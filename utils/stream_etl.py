@@ -0,0 +1,258 @@
+"""
+Streaming ETL: consume Strava stream samples in chunks and emit 30 s bins as
+soon as they close.
+
+    for row, zone_totals in stream_etl.iter_bins(chunks, cs_kmh=12.0, zones=ZONES):
+        ...
+
+Each chunk is a dict of equal-length sample arrays keyed like the Strava
+streams ("time", "distance", "velocity_smooth", "altitude", "heartrate"),
+either bare or as {"data": [...]}. Samples must arrive in time order.
+
+The output is identical to the batch path (ActivityFrame.from_streams ->
+compute_grade -> bins): the same interpolation brackets, forward fill,
+trailing grade window and bin kernel are applied, with the state that crosses
+chunk boundaries carried explicitly:
+
+- distance/altitude seconds after the last known sample wait for the next one
+  (or close()), because interpolation needs the right-hand bracket;
+- the last heart-rate value (forward fill) and the resolved seconds back to
+  the current grade window start (`window_m` of distance) are kept;
+- resolved seconds that do not complete a bin wait for the next chunk.
+
+Memory therefore stays bounded by one chunk plus one bin plus any gap in the
+distance/altitude streams (and any standing-still stretch inside the grade
+window). Altitude denoising is a centred filter and is batch-only.
+
+Which channels exist is decided from the first chunk (override with `keys`);
+a velocity stream that is present but null for the whole activity is the one
+case where batch falls back to distance differences and streaming cannot
+know that in advance.
+"""
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+
+try:
+    from utils import etl
+    from utils.frame import HR_MISSING
+except ModuleNotFoundError:
+    import etl                     # type: ignore
+    from frame import HR_MISSING   # type: ignore
+
+CHANNELS = ("distance", "velocity_smooth", "altitude", "heartrate")
+
+
+def _unwrap(x) -> np.ndarray:
+    if isinstance(x, dict):
+        x = x.get("data", [])
+    return np.asarray(x, dtype=np.float64)
+
+
+class StreamingETL:
+    def __init__(self, width: int = 30, window_m: float = etl.GRADE_WINDOW_M, cs_kmh: Optional[float] = None,
+                 zones: Optional[Dict[str, Tuple[float, float]]] = None, keys: Optional[Sequence[str]] = None):
+        self.width = width
+        self.window_m = window_m
+        self.cs_kmh, self.zones = cs_kmh, zones
+        self.keys = None if keys is None else tuple(keys)
+        self.zone_totals: Dict[str, float] = {}
+        self.closed = False
+        self._t0 = None
+        self._t_last = None
+        self._raw: Dict[str, np.ndarray] = {}      # unconsumed raw samples (pos relative to t0)
+        self._next = 0                             # next unresolved second (relative)
+        self._last_hr = np.nan
+        self._prev_dist = None                     # for v from distance differences
+        self._tail_dist = np.zeros(0)
+        self._tail_alt = np.zeros(0, dtype=np.float32)
+        self._pending: Dict[str, np.ndarray] = {}  # resolved seconds of the open bin
+
+    # ---------- input ----------
+    def feed(self, chunk: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Add samples; return the bins (as dict rows) that closed."""
+        if self.closed:
+            raise ValueError("StreamingETL already closed")
+        t = _unwrap(chunk.get("time", []))
+        if len(t) == 0:
+            return []
+        if self.keys is None:
+            self.keys = tuple(k for k in CHANNELS if k in chunk and len(_unwrap(chunk[k])) > 0)
+            if "distance" not in self.keys:
+                raise ValueError("No distance stream")
+        if self._t0 is None:
+            self._t0 = int(t[0])
+            self._raw = {"pos": np.zeros(0), **{k: np.zeros(0) for k in self.keys}}
+        pos = t - self._t0
+        if np.any(np.diff(pos) <= 0) or (len(self._raw["pos"]) and pos[0] <= self._raw["pos"][-1]):
+            raise ValueError("stream samples must arrive in increasing time order")
+        self._raw["pos"] = np.concatenate([self._raw["pos"], pos])
+        for k in self.keys:
+            x = _unwrap(chunk[k]) if k in chunk else np.full(len(t), np.nan)
+            self._raw[k] = np.concatenate([self._raw[k], x])
+        self._t_last = int(pos[-1])
+        return self._advance()
+
+    def close(self) -> List[Dict[str, Any]]:
+        """End of stream: resolve the trailing seconds and flush the last bin."""
+        if self.closed:
+            return []
+        self.closed = True
+        if self._t0 is None:
+            return []
+        return self._advance()
+
+    # ---------- resolution ----------
+    def _horizon(self) -> int:
+        """Last second whose interpolated channels are fully determined."""
+        if self.closed:
+            return self._t_last
+        h = self._t_last
+        for k in ("distance", "altitude"):
+            if k in self.keys:
+                ok = ~np.isnan(self._raw[k])
+                h = min(h, int(self._raw["pos"][ok][-1]) if ok.any() else -1)
+        return h
+
+    def _advance(self) -> List[Dict[str, Any]]:
+        h = self._horizon()
+        if h < self._next:
+            return self._emit(final=self.closed)
+        raw = self._raw
+        grid = np.arange(self._next, h + 1, dtype=np.float64)
+        n = len(grid)
+
+        def interp(x):
+            ok = ~np.isnan(x)
+            if not ok.any():
+                return np.full(n, np.nan)
+            return np.interp(grid, raw["pos"][ok], x[ok])
+
+        new = raw["pos"] >= self._next          # raw samples not consumed yet
+        at = (raw["pos"][new] - self._next).astype(np.int64)
+        inside = at < n
+        at_in = at[inside]
+
+        distance = interp(raw["distance"])
+        v = np.full(n, np.nan, dtype=np.float32)
+        if "velocity_smooth" in self.keys:
+            v[at_in] = raw["velocity_smooth"][new][inside]
+        else:
+            prev = distance[0] if self._prev_dist is None else self._prev_dist
+            head = np.empty(n)
+            head[0] = prev
+            head[1:] = distance[:-1]
+            np.subtract(distance, head, out=v, casting="same_kind")
+            if self._prev_dist is None:
+                v[0] = 0.0
+        np.clip(v, 0, 10, out=v)
+        altitude = (interp(raw["altitude"]) if "altitude" in self.keys else np.full(n, np.nan)).astype(np.float32)
+
+        hr = np.zeros(n, dtype=np.uint8)
+        if "heartrate" in self.keys:
+            full = np.full(n, np.nan, dtype=np.float32)
+            full[at_in] = raw["heartrate"][new][inside]
+            if np.isnan(full[0]):
+                full[0] = self._last_hr
+            idx = np.arange(n, dtype=np.int32)
+            idx[np.isnan(full)] = -1
+            np.maximum.accumulate(idx, out=idx)
+            known = idx >= 0
+            hr[known] = np.clip(np.rint(full[idx[known]]), 35, 220)
+            if known[-1]:
+                self._last_hr = full[idx[-1]]
+
+        grade = self._grade(distance, altitude)
+        self._prev_dist = distance[-1]
+        t_abs = (self._t0 + grid).astype(np.uint32)
+        self._next = h + 1
+        self._trim()
+        self._append_pending({"t": t_abs, "v": v, "grade": grade, "hr": hr})
+        return self._emit(final=self.closed)
+
+    def _grade(self, distance: np.ndarray, altitude: np.ndarray) -> np.ndarray:
+        """
+        Distance-window grade continued across chunk boundaries. The tail keeps
+        every second from the last window start on (monotone distance), so
+        each new window start is inside tail + new.
+        """
+        n_prev = len(self._tail_dist)
+        ext_d = np.fmax.accumulate(np.concatenate([self._tail_dist, distance]))
+        ext_a = np.concatenate([self._tail_alt, altitude])
+        g = etl.grade_kernel(ext_d, ext_a, self.window_m, out=np.empty(len(ext_d), dtype=np.float32))
+        keep = max(int(np.searchsorted(ext_d, ext_d[-1] - self.window_m, side="right")) - 1, 0)
+        self._tail_dist, self._tail_alt = ext_d[keep:], ext_a[keep:]
+        return g[n_prev:]
+
+    def _trim(self):
+        """Drop raw samples no longer needed as interpolation brackets."""
+        raw = self._raw
+        keep = self._next
+        for k in ("distance", "altitude"):
+            if k in self.keys:
+                ok = ~np.isnan(raw[k]) & (raw["pos"] < self._next)
+                if ok.any():
+                    keep = min(keep, raw["pos"][ok][-1])
+        # brackets kept from before _next are only used for interpolation;
+        # v and hr read samples at pos >= _next
+        sel = raw["pos"] >= keep
+        for k in raw:
+            raw[k] = raw[k][sel]
+
+    # ---------- binning ----------
+    def _append_pending(self, cols: Dict[str, np.ndarray]):
+        if not self._pending:
+            self._pending = cols
+        else:
+            self._pending = {k: np.concatenate([self._pending[k], cols[k]]) for k in cols}
+
+    def _emit(self, final: bool) -> List[Dict[str, Any]]:
+        p = self._pending
+        if not p or len(p["t"]) == 0:
+            return []
+        if final:
+            cut = len(p["t"])
+        else:
+            last_t = int(p["t"][-1])
+            # the bin holding the newest second is complete only at its last second
+            complete_through = last_t // self.width - (0 if (last_t + 1) % self.width == 0 else 1)
+            cut = int(np.searchsorted(p["t"] // self.width, complete_through, side="right"))
+        if cut == 0:
+            return []
+        hr = p["hr"][:cut].astype(np.float32)
+        hr[p["hr"][:cut] == HR_MISSING] = np.nan
+        v, grade = p["v"][:cut], p["grade"][:cut]
+        v_flat = np.empty(cut, dtype=np.float32)
+        etl.v_flat_from_grade(v, grade, out=v_flat)
+        bins = etl.bin_arrays(p["t"][:cut], v, grade, hr, self.width, v_flat=v_flat)
+        self._pending = {k: a[cut:] for k, a in p.items()}
+        self._count_zones(bins)
+        return bins.to_dict("records")
+
+    def _count_zones(self, bins: pd.DataFrame):
+        if self.cs_kmh is None or self.zones is None or bins.empty:
+            return
+        valid = bins[bins["valid_bin"]]
+        labels = etl.classify_zones(valid["vflat_kmh"].to_numpy(dtype=float), self.cs_kmh, self.zones)
+        for z, s in zip(labels, valid["seconds"].to_numpy()):
+            self.zone_totals[z] = self.zone_totals.get(z, 0) + int(s)
+
+
+def iter_bins(chunks: Iterable[Dict[str, Any]], width: int = 30, cs_kmh: Optional[float] = None,
+              zones: Optional[Dict[str, Tuple[float, float]]] = None,
+              keys: Optional[Sequence[str]] = None) -> Iterator[Tuple[Dict[str, Any], Dict[str, float]]]:
+    """Yield (bin row, running zone seconds) as each bin closes."""
+    s = StreamingETL(width=width, cs_kmh=cs_kmh, zones=zones, keys=keys)
+    for chunk in chunks:
+        for row in s.feed(chunk):
+            yield row, dict(s.zone_totals)
+    for row in s.close():
+        yield row, dict(s.zone_totals)
+
+
+def chunk_streams(streams: Dict[str, Any], size: int = 600) -> Iterator[Dict[str, np.ndarray]]:
+    """Split a full key_by_type payload into sample chunks (e.g. to replay a partial upload)."""
+    cols = {k: _unwrap(v) for k, v in streams.items() if k == "time" or k in CHANNELS}
+    n = len(cols.get("time", []))
+    for i in range(0, n, size):
+        yield {k: x[i:i + size] for k, x in cols.items() if len(x)}
@@ -0,0 +1,113 @@
+"""
+Local content-addressed store for raw Strava streams.
+
+Strava streams never change after upload, so each stream array is written
+once as a `.npy` blob named by the SHA-256 of its contents (identical arrays,
+e.g. common `time` ramps, are stored once). An append-only `index.jsonl`
+maps activity_id -> {stream key: digest}; it is loaded into a dict so
+"is this activity cached" is an O(1) lookup. Reads memory-map the blobs.
+"""
+import os, json, hashlib, threading
+from typing import Any, Dict, Optional
+import numpy as np
+
+STREAM_KEYS = ("time", "distance", "velocity_smooth", "altitude", "heartrate")
+DEFAULT_ROOT = os.environ.get("ONFLOWS_STREAM_STORE", os.path.join(".cache", "streams"))
+
+
+def _as_array(data) -> np.ndarray:
+    arr = np.asarray(data)
+    if arr.dtype == object:          # None gaps in the payload
+        arr = np.asarray(data, dtype=float)
+    elif arr.dtype.kind in "iu":
+        arr = arr.astype(np.int32)
+    elif arr.dtype.kind == "f":
+        arr = arr.astype(np.float64)
+    return np.ascontiguousarray(arr)
+
+
+def _digest(arr: np.ndarray) -> str:
+    h = hashlib.sha256()
+    h.update(f"{arr.dtype.str}{arr.shape}".encode())
+    h.update(arr.tobytes())
+    return h.hexdigest()
+
+
+class StreamStore:
+    def __init__(self, root: str = DEFAULT_ROOT):
+        self.root = root
+        self.objects = os.path.join(root, "objects")
+        self.index_path = os.path.join(root, "index.jsonl")
+        os.makedirs(self.objects, exist_ok=True)
+        self._lock = threading.Lock()
+        self._index: Dict[str, Dict[str, str]] = {}
+        self._load_index()
+
+    def _load_index(self):
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path) as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue  # torn last line from an interrupted write
+                self._index[str(rec["id"])] = rec["streams"]
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.objects, digest[:2], f"{digest}.npy")
+
+    def __contains__(self, activity_id) -> bool:
+        return str(activity_id) in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def activity_ids(self):
+        return [int(k) for k in self._index]
+
+    def put(self, activity_id: int, streams: Dict[str, Any]) -> None:
+        """Store a key_by_type streams payload (only STREAM_KEYS are kept)."""
+        refs = {}
+        for key in STREAM_KEYS:
+            s = streams.get(key)
+            if not isinstance(s, dict) or s.get("data") is None:
+                continue
+            arr = _as_array(s["data"])
+            digest = _digest(arr)
+            path = self._blob_path(digest)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp, "wb") as f:
+                    np.save(f, arr, allow_pickle=False)
+                os.replace(tmp, path)
+            refs[key] = digest
+        with self._lock:
+            with open(self.index_path, "a") as f:
+                f.write(json.dumps({"id": int(activity_id), "streams": refs}) + "\n")
+            self._index[str(activity_id)] = refs
+
+    def get(self, activity_id: int, mmap: bool = True) -> Optional[Dict[str, Any]]:
+        """Return streams as {key: {"data": ndarray}} or None if not cached."""
+        refs = self._index.get(str(activity_id))
+        if refs is None:
+            return None
+        mode = "r" if mmap else None
+        try:
+            return {k: {"data": np.load(self._blob_path(d), mmap_mode=mode, allow_pickle=False)}
+                    for k, d in refs.items()}
+        except FileNotFoundError:
+            return None  # blob removed behind our back -> treat as a miss
+
+
+_default: Optional[StreamStore] = None
+_default_lock = threading.Lock()
+
+
+def default_store() -> StreamStore:
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = StreamStore()
+    return _default
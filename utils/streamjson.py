@@ -0,0 +1,180 @@
+"""
+Decode Strava stream payloads straight into NumPy arrays.
+
+    streams = loads_streams(body_bytes)                      # whole body
+    streams = decode_chunks(r.iter_content(CHUNK_BYTES))     # streamed body
+
+Every `"data": [n, n, null, ...]` array of numbers is parsed in ~1 MiB
+slices by Arrow's CSV reader (one number per line, null -> NaN; NumPy's text
+parser when pyarrow is missing) into an int64 array (integer-only text, e.g.
+`time`) or a float64 array, so no Python list of boxed floats is ever built
+and peak memory stays at the arrays plus one slice. Everything else (stream
+keys, series_type, original_size, ...) is a small skeleton that is parsed as
+ordinary JSON (orjson when installed). Arrays of anything other than numbers
+(latlng pairs, `moving` booleans) are passed through as lists.
+"""
+import re, json, warnings
+from functools import lru_cache
+from typing import Any, Iterable, List
+
+import numpy as np
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+CHUNK_BYTES = 1 << 16     # iter_content chunk size
+PARSE_BYTES = 1 << 20     # number text handed to the parser at once
+_DATA = re.compile(rb'"data"\s*:\s*\[')
+_BRACKETS = re.compile(rb"[\[\]]")
+_TAIL = 64                # bytes kept back in case "data": [ straddles two chunks
+_FLOAT_MARKS = (b".", b"e", b"E", b"n")  # n: null / nan
+_PLACEHOLDER = "__ndarray__"
+
+
+@lru_cache(maxsize=1)
+def _arrow_csv():
+    """(read_csv, options) from pyarrow, imported on first use; None without pyarrow."""
+    try:
+        import pyarrow as pa
+        import pyarrow.csv as pacsv
+    except ImportError:
+        return None
+    read = pacsv.ReadOptions(autogenerate_column_names=True, use_threads=False, block_size=1 << 24)
+    convert = pacsv.ConvertOptions(null_values=["null"], column_types={"f0": pa.float64()})
+    return lambda lines: pacsv.read_csv(pa.BufferReader(lines), read_options=read,
+                                        convert_options=convert).column(0).to_numpy()
+
+
+def parse_numbers(text: bytes) -> np.ndarray:
+    """'1.5,null,3' -> float64 array [1.5, nan, 3]; ValueError on anything else."""
+    text = text.translate(None, b" \t\r\n")
+    if not text:
+        return np.empty(0)
+    arrow = _arrow_csv()
+    if arrow is not None:
+        arr = arrow(text.replace(b",", b"\n") + b"\n")
+    else:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", DeprecationWarning)  # reported below as ValueError
+            arr = np.fromstring(text.replace(b"null", b"nan"), dtype=np.float64, sep=",")
+    if len(arr) != text.count(b",") + 1:
+        raise ValueError(f"malformed number array near {text[:40]!r}")
+    return arr
+
+
+class StreamsDecoder:
+    """Incremental decoder: feed() body chunks in order, then result()."""
+
+    def __init__(self):
+        self._buf = b""
+        self._skeleton: List[bytes] = []
+        self._arrays: List[np.ndarray] = []
+        self._mode = "meta"        # meta | start | numbers | verbatim
+        self._parts: List[np.ndarray] = []
+        self._pending: List[bytes] = []
+        self._pending_n = 0
+        self._is_float = False
+        self._depth = 0
+
+    def feed(self, chunk: bytes) -> None:
+        self._buf += chunk
+        while self._step():
+            pass
+
+    def _step(self) -> bool:
+        """Consume as much of the buffer as the current mode can; True to go on."""
+        buf = self._buf
+        if self._mode == "meta":
+            m = _DATA.search(buf)
+            if m is None:
+                keep = max(len(buf) - _TAIL, 0)
+                self._skeleton.append(buf[:keep])
+                self._buf = buf[keep:]
+                return False
+            self._skeleton.append(buf[:m.start()] + b'"data":')
+            self._buf, self._mode = buf[m.end():], "start"
+            return True
+        if self._mode == "start":
+            body = buf.lstrip()
+            if not body:
+                self._buf = b""
+                return False
+            if body[:1] in b'[{"tf':  # not a flat array of numbers: keep it as JSON
+                self._skeleton.append(b"[")
+                self._buf, self._mode, self._depth = body, "verbatim", 1
+            else:
+                self._buf, self._mode, self._parts, self._is_float = body, "numbers", [], False
+            return True
+        if self._mode == "numbers":
+            end = buf.find(b"]")
+            if end < 0:
+                cut = buf.rfind(b",")
+                if cut >= 0:  # only whole tokens; the rest waits for the next chunk
+                    self._take(buf[:cut])
+                    self._buf = buf[cut + 1:]
+                return False
+            self._take(buf[:end], last=True)
+            arr = np.concatenate(self._parts) if self._parts else np.empty(0)
+            if not self._is_float:
+                arr = arr.astype(np.int64)
+            self._skeleton.append(b'{"%s":%d}' % (_PLACEHOLDER.encode(), len(self._arrays)))
+            self._arrays.append(arr)
+            self._buf, self._mode, self._parts = buf[end + 1:], "meta", []
+            return True
+        # verbatim: copy through the matching bracket
+        for m in _BRACKETS.finditer(buf):
+            self._depth += 1 if m.group() == b"[" else -1
+            if self._depth == 0:
+                self._skeleton.append(buf[:m.end()])
+                self._buf, self._mode = buf[m.end():], "meta"
+                return True
+        self._skeleton.append(buf)
+        self._buf = b""
+        return False
+
+    def _take(self, text: bytes, last: bool = False) -> None:
+        """Queue whole tokens; parse once PARSE_BYTES are pending or the array ends."""
+        if text.strip():
+            self._is_float = self._is_float or any(mark in text for mark in _FLOAT_MARKS)
+            self._pending.append(text)
+            self._pending_n += len(text)
+        if self._pending and (last or self._pending_n >= PARSE_BYTES):
+            self._parts.append(parse_numbers(b",".join(self._pending)))
+            self._pending, self._pending_n = [], 0
+
+    def result(self) -> Any:
+        if self._mode != "meta":
+            raise ValueError("truncated stream payload")
+        self._skeleton.append(self._buf)
+        self._buf = b""
+        return _fill(_loads(b"".join(self._skeleton)), self._arrays)
+
+
+def _fill(node: Any, arrays: List[np.ndarray]) -> Any:
+    if isinstance(node, dict):
+        if len(node) == 1 and _PLACEHOLDER in node:
+            return arrays[node[_PLACEHOLDER]]
+        return {k: _fill(v, arrays) for k, v in node.items()}
+    if isinstance(node, list):
+        return [_fill(v, arrays) for v in node]
+    return node
+
+
+def decode_chunks(chunks: Iterable[bytes]) -> Any:
+    """Decode a body delivered in pieces (e.g. requests' iter_content)."""
+    dec = StreamsDecoder()
+    for chunk in chunks:
+        if chunk:
+            dec.feed(chunk)
+    return dec.result()
+
+
+def loads_streams(body: bytes) -> Any:
+    """Decode a whole stream payload; `data` number arrays come back as ndarrays."""
+    if isinstance(body, str):
+        body = body.encode()
+    return decode_chunks([body])
+
@@ -0,0 +1,215 @@
+"""
+Lightweight spans: wall time, bytes, rows and call counts per stage.
+
+    with tracing.span("strava.api_get", path=path) as sp:
+        r = ...
+        sp.add(bytes=len(r.content))
+
+    @tracing.traced("etl.bin_arrays")            # rows = len(result)
+    def bin_arrays(...): ...
+
+Tracing is off unless ONFLOWS_TRACE=1 or tracing.enable() is called. When off,
+span() returns a shared no-op object and traced() wrappers call straight
+through after one flag check (~0.3 µs per instrumented call).
+
+When on, each finished span is added to the cumulative per-name totals
+(process lifetime; what to_prometheus() exports) and to the current run, a
+bounded event list started with new_run() (one Streamlit rerun or one worker
+job). Spans from threads that have no run of their own (e.g. download pools)
+go to the most recently started run.
+"""
+import os, json, time, threading
+from collections import deque
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+MAX_EVENTS = 5000  # per run
+COUNTERS = ("bytes", "rows")
+
+_enabled = os.environ.get("ONFLOWS_TRACE", "") not in ("", "0", "false")
+_lock = threading.Lock()
+_totals: Dict[str, Dict[str, float]] = {}
+_stack = threading.local()
+
+
+class Run:
+    """Events recorded during one rerun / job."""
+    def __init__(self, label: str = ""):
+        self.label = label
+        self.started = time.time()
+        self.events: Deque[Dict[str, Any]] = deque(maxlen=MAX_EVENTS)
+
+
+_run: ContextVar[Optional[Run]] = ContextVar("onflows_trace_run", default=None)
+_last_run: Optional[Run] = None
+
+
+def enable(on: bool = True):
+    global _enabled
+    _enabled = on
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def new_run(label: str = "") -> Run:
+    """Start collecting events for a new rerun/job in this context."""
+    global _last_run
+    run = Run(label)
+    _run.set(run)
+    _last_run = run
+    return run
+
+
+def current_run() -> Optional[Run]:
+    return _run.get() or _last_run
+
+
+# ---------- spans ----------
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add(self, **kw):
+        pass
+
+    def __bool__(self):
+        return False
+
+
+NOOP = _NoopSpan()
+
+
+class Span:
+    __slots__ = ("name", "attrs", "t0", "parent")
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.attrs = attrs
+        self.t0 = 0.0
+        self.parent = None
+
+    def add(self, **kw):
+        """Accumulate counters (bytes, rows) or set attributes."""
+        for k, v in kw.items():
+            if k in COUNTERS:
+                self.attrs[k] = self.attrs.get(k, 0) + (v or 0)
+            else:
+                self.attrs[k] = v
+
+    def __enter__(self):
+        stack = getattr(_stack, "names", None)
+        if stack is None:
+            stack = _stack.names = []
+        self.parent = stack[-1] if stack else None
+        stack.append(self.name)
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        dt = time.perf_counter() - self.t0
+        _stack.names.pop()
+        _record(self, dt, exc_type)
+        return False
+
+
+def span(name: str, **attrs):
+    """Context manager timing a block; returns the no-op span when tracing is off."""
+    if not _enabled:
+        return NOOP
+    return Span(name, attrs)
+
+
+def _record(sp: Span, dt: float, exc_type):
+    with _lock:
+        tot = _totals.get(sp.name)
+        if tot is None:
+            tot = _totals[sp.name] = {"calls": 0, "errors": 0, "seconds": 0.0, "max_s": 0.0, "bytes": 0, "rows": 0}
+        tot["calls"] += 1
+        tot["seconds"] += dt
+        tot["max_s"] = max(tot["max_s"], dt)
+        tot["errors"] += exc_type is not None
+        for k in COUNTERS:
+            tot[k] += sp.attrs.get(k, 0) or 0
+    run = current_run()
+    if run is not None:
+        run.events.append({"name": sp.name, "parent": sp.parent, "ts": time.time() - dt,
+                           "ms": round(dt * 1e3, 3), "error": exc_type.__name__ if exc_type else None,
+                           **sp.attrs})
+
+
+def traced(name: Optional[str] = None, rows: bool = True):
+    """
+    Decorator: one span per call, named `name` (default module.function).
+    With rows=True the result's len() (DataFrame, list, array) is recorded.
+    """
+    def deco(fn: Callable) -> Callable:
+        label = name or f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__name__}"
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with Span(label, {}) as sp:
+                out = fn(*args, **kwargs)
+                if rows and hasattr(out, "__len__"):
+                    sp.add(rows=len(out))
+                return out
+        return wrapper
+    return deco
+
+
+# ---------- reports / export ----------
+def summary(run: Optional[Run] = None) -> List[Dict[str, Any]]:
+    """Per span name for one run (default: current): calls, total/max ms, bytes, rows, errors."""
+    run = run or current_run()
+    out: Dict[str, Dict[str, Any]] = {}
+    for e in list(run.events) if run else []:
+        s = out.setdefault(e["name"], {"span": e["name"], "calls": 0, "total_ms": 0.0, "max_ms": 0.0,
+                                       "bytes": 0, "rows": 0, "errors": 0})
+        s["calls"] += 1
+        s["total_ms"] = round(s["total_ms"] + e["ms"], 3)
+        s["max_ms"] = max(s["max_ms"], e["ms"])
+        s["bytes"] += e.get("bytes", 0) or 0
+        s["rows"] += e.get("rows", 0) or 0
+        s["errors"] += e["error"] is not None
+    return sorted(out.values(), key=lambda s: -s["total_ms"])
+
+
+def to_jsonl(run: Optional[Run] = None) -> str:
+    """One JSON object per span event."""
+    run = run or current_run()
+    return "".join(json.dumps(e, default=str) + "\n" for e in (list(run.events) if run else []))
+
+
+def to_prometheus(prefix: str = "onflows_span") -> str:
+    """Cumulative per-span counters in the Prometheus text exposition format."""
+    with _lock:
+        snap = {k: dict(v) for k, v in _totals.items()}
+    metrics = [("calls_total", "calls", "Spans finished"),
+               ("errors_total", "errors", "Spans that raised"),
+               ("seconds_total", "seconds", "Wall time in spans"),
+               ("seconds_max", "max_s", "Slowest span"),
+               ("bytes_total", "bytes", "Bytes transferred"),
+               ("rows_total", "rows", "Rows/records handled")]
+    lines = []
+    for suffix, key, doc in metrics:
+        kind = "gauge" if suffix.endswith("max") else "counter"
+        lines += [f"# HELP {prefix}_{suffix} {doc}", f"# TYPE {prefix}_{suffix} {kind}"]
+        for name in sorted(snap):
+            label = name.replace("\\", "\\\\").replace('"', '\\"')
+            lines.append(f'{prefix}_{suffix}{{span="{label}"}} {snap[name][key]:.17g}')
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    """Forget cumulative totals (tests / long-running processes)."""
+    with _lock:
+        _totals.clear()
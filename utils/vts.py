@@ -1,7 +1,13 @@
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional
+from functools import lru_cache
 import numpy as np
 import pandas as pd
 
+try:
+    from utils import tracing
+except ModuleNotFoundError:
+    import tracing  # type: ignore
+
 
 # ---------- I/O ----------
 def load_ideal_csv(path: str) -> pd.DataFrame:
@@ -18,6 +24,7 @@ def load_ideal_csv(path: str) -> pd.DataFrame:
 
 
 # ---------- CS / W′ ----------
+@tracing.traced(rows=False)
 def estimate_cs_wprime(points: List[Tuple[float, float]]) -> Tuple[float, float]:
     """
     points: list of (T_sec, v_kmh) steady bests. Returns (CS_kmh, Wprime_m).
@@ -34,7 +41,103 @@ def estimate_cs_wprime(points: List[Tuple[float, float]]) -> Tuple[float, float]
     return float(3.6 * cs_mps), float(max(wprime_m, 0.0))
 
 
+def cs_wprime_from_stats(n, sT, sT2, sD, sTD) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Closed-form least squares of D = CS*T + W′ from sufficient statistics
+    (n, ΣT, ΣT², ΣD, ΣT·D), vectorized over any array shape.
+    Returns (CS_kmh, Wprime_m); NaN where n < 3 or all T are equal.
+    """
+    n, sT, sT2, sD, sTD = (np.asarray(x, dtype=float) for x in (n, sT, sT2, sD, sTD))
+    det = n * sT2 - sT * sT
+    ok = (n >= 3) & (det > 1e-9 * np.maximum(n * sT2, 1.0))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cs_mps = np.where(ok, (n * sTD - sT * sD) / det, np.nan)
+        wprime = np.where(ok, (sD - cs_mps * sT) / n, np.nan)
+    return 3.6 * cs_mps, np.where(ok, np.maximum(wprime, 0.0), np.nan)
+
+
+class CSWindowStats:
+    """
+    Running sufficient statistics for one CS/W′ window: add points as
+    activities enter the window, remove them as they leave, fit() any time
+    in O(1) (same result as estimate_cs_wprime on the current points).
+    """
+    __slots__ = ("n", "sT", "sT2", "sD", "sTD")
+
+    def __init__(self):
+        self.n = self.sT = self.sT2 = self.sD = self.sTD = 0.0
+
+    def _apply(self, points: List[Tuple[float, float]], sign: float):
+        for T, v_kmh in points:
+            D = v_kmh / 3.6 * T
+            self.n += sign
+            self.sT += sign * T
+            self.sT2 += sign * T * T
+            self.sD += sign * D
+            self.sTD += sign * T * D
+
+    def add(self, points: List[Tuple[float, float]]):
+        self._apply(points, 1.0)
+
+    def remove(self, points: List[Tuple[float, float]]):
+        self._apply(points, -1.0)
+
+    def fit(self) -> Tuple[float, float]:
+        cs, wp = cs_wprime_from_stats(self.n, self.sT, self.sT2, self.sD, self.sTD)
+        return float(cs), float(wp)
+
+
+@tracing.traced()
+def rolling_cs_wprime(points: pd.DataFrame, window_days: int = 42, step_days: int = 1) -> pd.DataFrame:
+    """
+    CS/W′ per athlete over rolling windows in one vectorized pass.
+
+    points: columns athlete_id, date, T_sec, v_kmh (e.g. mean-max points per
+    activity). Daily sufficient statistics are laid out per athlete on one
+    flat day axis, prefix-summed once, and every window is a difference of two
+    prefix sums, so each day adds the activities entering the window and drops
+    the ones leaving it without refitting. Windows end on every `step_days`-th
+    day from each athlete's first day. Returns athlete_id, window_end, n,
+    cs_kmh, wprime_m.
+    """
+    cols = ["athlete_id", "window_end", "n", "cs_kmh", "wprime_m"]
+    if points.empty:
+        return pd.DataFrame(columns=cols)
+    ath, a_idx = np.unique(points["athlete_id"].to_numpy(), return_inverse=True)
+    day = pd.to_datetime(points["date"]).to_numpy().astype("datetime64[D]").astype(np.int64)
+    T = points["T_sec"].to_numpy(dtype=float)
+    D = points["v_kmh"].to_numpy(dtype=float) / 3.6 * T
+
+    dmin = np.full(len(ath), np.iinfo(np.int64).max)
+    dmax = np.full(len(ath), np.iinfo(np.int64).min)
+    np.minimum.at(dmin, a_idx, day)
+    np.maximum.at(dmax, a_idx, day)
+    length = dmax - dmin + 1
+    off = np.r_[0, np.cumsum(length)[:-1]]
+    total = int(length.sum())
+
+    flat = off[a_idx] + (day - dmin[a_idx])
+    stats = [np.bincount(flat, weights=w, minlength=total) for w in (np.ones_like(T), T, T * T, D, T * D)]
+    prefix = [np.r_[0.0, np.cumsum(x)] for x in stats]
+
+    # window end positions on the flat axis, and their (clamped) starts
+    seg = np.repeat(np.arange(len(ath)), length)
+    rel = np.arange(total) - off[seg]
+    end = np.flatnonzero(rel % step_days == 0)
+    start = np.maximum(end - window_days + 1, off[seg[end]])
+    n, sT, sT2, sD, sTD = (p[end + 1] - p[start] for p in prefix)
+    cs, wp = cs_wprime_from_stats(n, sT, sT2, sD, sTD)
+    return pd.DataFrame({
+        "athlete_id": ath[seg[end]],
+        "window_end": (dmin[seg[end]] + rel[end]).astype("datetime64[D]"),
+        "n": n.round().astype(np.int64),
+        "cs_kmh": cs,
+        "wprime_m": wp,
+    }, columns=cols)
+
+
 # ---------- VTS Baseline + Models ----------
+@tracing.traced()
 def baseline_vts(cs_kmh: float, wprime_m: float, v_min_kmh: float = 8.0,
                  v_max_kmh: float = 20.0, n: int = 160) -> pd.DataFrame:
     """
@@ -64,16 +167,19 @@ def baseline_vts(cs_kmh: float, wprime_m: float, v_min_kmh: float = 8.0,
     return pd.DataFrame({"v_kmh": v, "t_sec": t_sec})
 
 
+def volume_drive(delta_Tz: Dict[str, float]) -> float:
+    """Combine zone effects into one scalar D (knobs easy to tune later)."""
+    return 0.6 * (delta_Tz.get("Z1", 0) + delta_Tz.get("Z2", 0)) \
+        + 0.2 * (delta_Tz.get("Z3", 0)) \
+        - 0.9 * (delta_Tz.get("Z4", 0) + delta_Tz.get("Z5", 0))
+
+
 def modeled_vts_volume(t0: pd.DataFrame, delta_Tz: Dict[str, float]) -> pd.DataFrame:
     """
     Simple "volume warp": small global change based on Z1..Z5 deltas.
     Keeps change within ±25% vs baseline to prevent unrealistic results.
     """
-    # Combine zone effects (knobs easy to tune later)
-    D = 0.6 * (delta_Tz.get("Z1", 0) + delta_Tz.get("Z2", 0)) \
-        + 0.2 * (delta_Tz.get("Z3", 0)) \
-        - 0.9 * (delta_Tz.get("Z4", 0) + delta_Tz.get("Z5", 0))
-    gain = 1.0 + 0.18 * D
+    gain = 1.0 + 0.18 * volume_drive(delta_Tz)
 
     out = t0.copy()
     out["t_sec"] = np.clip(out["t_sec"] * gain, 0.75 * t0["t_sec"], 1.25 * t0["t_sec"])
@@ -91,3 +197,76 @@ def apply_hrv_gain(t: pd.DataFrame, delta_Iglob: float) -> pd.DataFrame:
     out = t.copy()
     out["t_sec"] = np.clip(base * gain, 0.75 * base, 1.25 * base)
     return out
+
+
+# ---------- Batched / cached evaluation ----------
+def vts_grid(cs_kmh, wprime_m, drive=0.0, delta_Iglob=0.0, v_kmh: Optional[np.ndarray] = None,
+             v_min_kmh: float = 8.0, v_max_kmh: float = 20.0, n: int = 160) -> Dict[str, np.ndarray]:
+    """
+    Evaluate baseline, volume-modeled and HR/V-modeled t(v) for whole parameter
+    grids in one broadcasted call. cs_kmh, wprime_m, drive (= volume_drive(ΔTz))
+    and delta_Iglob may be scalars or arrays that broadcast together, e.g.
+
+        g = vts_grid(cs[:, None], wp[None, :], v_kmh=np.array([15.0]))
+        g["hrv"][..., 0]          # (len(cs), len(wp)) time at 15 km/h
+
+    Returns {"v_kmh": (n,), "baseline"/"volume"/"hrv": params_shape + (n,)} in
+    seconds, with the same guards as baseline_vts / modeled_vts_volume / apply_hrv_gain.
+    """
+    v = np.linspace(v_min_kmh, v_max_kmh, n) if v_kmh is None else np.asarray(v_kmh, dtype=float)
+    cs = np.asarray(cs_kmh, dtype=float)[..., None] / 3.6
+    wp = np.asarray(wprime_m, dtype=float)[..., None]
+    d = np.asarray(drive, dtype=float)[..., None]
+    di = np.asarray(delta_Iglob, dtype=float)[..., None]
+    v_mps = v / 3.6
+
+    t_high = wp / np.maximum(v_mps - cs, 1e-4)
+    base = np.clip(np.where(v_mps > cs, t_high, 2 * 3600.0), 0.0, 6000.0)
+    vol = np.clip(base * (1.0 + 0.18 * d), 0.75 * base, 1.25 * base)
+    hrv = np.clip(vol * (1.0 + 0.5 * di), 0.75 * vol, 1.25 * vol)
+    return {"v_kmh": v, "baseline": base, "volume": vol, "hrv": hrv}
+
+
+# quantization steps for the memo: finer than any UI slider step
+_Q = {"cs": 0.01, "wp": 1.0, "drive": 1e-4, "dI": 1e-4}
+
+
+def _q(x: float, step: float) -> float:
+    return round(round(float(x) / step) * step, 10)
+
+
+@lru_cache(maxsize=512)
+def _curves_cached(cs: float, wp: float, drive: float, dI: float, n: int) -> Dict[str, np.ndarray]:
+    out = vts_grid(cs, wp, drive, dI, n=n)
+    for a in out.values():
+        a.setflags(write=False)  # shared between reruns -> read-only
+    return out
+
+
+@tracing.traced(rows=False)
+def vts_curves(cs_kmh: float, wprime_m: float, delta_Tz: Optional[Dict[str, float]] = None,
+               delta_Iglob: float = 0.0, n: int = 160) -> Dict[str, np.ndarray]:
+    """Memoized single-parameter-set curves (slider moves are cache hits)."""
+    return _curves_cached(_q(cs_kmh, _Q["cs"]), _q(wprime_m, _Q["wp"]),
+                          _q(volume_drive(delta_Tz or {}), _Q["drive"]), _q(delta_Iglob, _Q["dI"]), n)
+
+
+@lru_cache(maxsize=64)
+def _grid_cached(cs: Tuple[float, ...], wp: Tuple[float, ...], drive: float, dI: float,
+                 v: Tuple[float, ...]) -> np.ndarray:
+    out = vts_grid(np.array(cs)[:, None], np.array(wp)[None, :], drive, dI, v_kmh=np.array(v))["hrv"]
+    out.setflags(write=False)
+    return out
+
+
+@tracing.traced(rows=False)
+def vts_sensitivity(cs_values, wprime_values, v_kmh, delta_Tz: Optional[Dict[str, float]] = None,
+                    delta_Iglob: float = 0.0) -> np.ndarray:
+    """
+    Memoized CS × W′ grid of modeled (volume + HR/V) time in seconds at the
+    speeds `v_kmh`: shape (len(cs_values), len(wprime_values), len(v_kmh)).
+    """
+    return _grid_cached(tuple(_q(c, _Q["cs"]) for c in np.atleast_1d(cs_values)),
+                        tuple(_q(w, _Q["wp"]) for w in np.atleast_1d(wprime_values)),
+                        _q(volume_drive(delta_Tz or {}), _Q["drive"]), _q(delta_Iglob, _Q["dI"]),
+                        tuple(float(x) for x in np.atleast_1d(v_kmh)))
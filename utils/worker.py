@@ -0,0 +1,420 @@
+"""
+Background ingestion worker: runs the jobs in the local queue (utils.jobs) so
+Streamlit reruns only enqueue work and read finished results.
+
+    python -m utils.worker run --concurrency 4        # long-running worker
+    python -m utils.worker run --once                 # drain the queue and exit
+    python -m utils.worker webhook --port 8502        # Strava webhook -> queue
+    python -m utils.worker enqueue <user_id>          # queue a sync by hand
+
+Pipeline (each step enqueues the next, deduped per activity):
+
+    sync_user        new activities since the watermark -> fetch_streams per run
+    fetch_streams    download streams into the local stream store -> run_etl
+    run_etl          ActivityFrame -> 30 s bins, season-best CS, zone table -> write_aggregates
+    write_aggregates fold the zone table into zone_load_daily / zone_load_weekly
+
+run_etl and write_aggregates of one user are serialized (serial_key), which
+is what aggregates.apply_activity and the season-best state expect. Without
+the worker, the app folds synced runs in batches (fold_pending). Tokens
+are read from user_tokens and refreshed here; the queue never stores them.
+"""
+import os, sys, json, time, argparse, threading, traceback
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+import pandas as pd
+import requests
+
+try:
+    from utils import db
+    from utils import strava as su
+    from utils import sync
+    from utils import etl
+    from utils import vts
+    from utils import meanmax
+    from utils import aggregates
+    from utils import stream_store
+    from utils import tracing
+    from utils.frame import ActivityFrame
+    from utils.jobs import JobQueue
+except ModuleNotFoundError:
+    import db                  # type: ignore
+    import strava as su        # type: ignore
+    import sync                # type: ignore
+    import etl                 # type: ignore
+    import vts                 # type: ignore
+    import meanmax             # type: ignore
+    import aggregates          # type: ignore
+    import stream_store        # type: ignore
+    import tracing             # type: ignore
+    from frame import ActivityFrame  # type: ignore
+    from jobs import JobQueue        # type: ignore
+
+DEFAULT_CS_KMH, DEFAULT_WPRIME_M = 12.0, 15000.0
+FOLD_BATCH = 25          # runs folded per fold_pending call (inline mode, one click)
+TOKEN_MARGIN_S = 120
+TRACE_FILE = os.environ.get("ONFLOWS_TRACE_FILE")  # append span events (JSON lines) per job
+_trace_lock = threading.Lock()
+
+
+def _secrets(section: str) -> Dict[str, Any]:
+    try:
+        import streamlit as st
+        return dict(st.secrets.get(section, {}))
+    except Exception:
+        return {}  # no secrets.toml: defaults / environment only
+
+
+def _records(df: pd.DataFrame):
+    """DataFrame -> JSON-safe rows (NaN -> None, numpy scalars -> Python)."""
+    return json.loads(df.to_json(orient="records"))
+
+
+# ---------- season best ----------
+def season_best(queue: JobQueue, user_id: str) -> Optional[pd.DataFrame]:
+    """The user's season-best mean-max curve, kept in the queue's state table."""
+    stored = queue.get_state(f"season_best:{user_id}")
+    return pd.DataFrame(stored) if stored else None
+
+
+def fold_season_best(queue: JobQueue, user_id: str, curve: pd.DataFrame) -> pd.DataFrame:
+    """Merge one activity curve into the stored season best (idempotent) and save it."""
+    season = meanmax.merge_best(season_best(queue, user_id), curve)
+    queue.set_state(f"season_best:{user_id}", _records(season))
+    return season
+
+
+def fit_cs(season: Optional[pd.DataFrame]) -> Tuple[float, float, int]:
+    """(CS km/h, W′ m, fitted durations) from a season-best curve; defaults below 3 points."""
+    pts = meanmax.cs_points(season) if season is not None else []
+    if len(pts) < 3:
+        return DEFAULT_CS_KMH, DEFAULT_WPRIME_M, len(pts)
+    cs_kmh, wprime_m = vts.estimate_cs_wprime(pts)
+    return float(cs_kmh), float(wprime_m), len(pts)
+
+
+# ---------- tokens ----------
+_token_lock = threading.Lock()
+
+
+def access_token_for(user_id: str) -> str:
+    """Current access token from user_tokens, refreshed (and saved) when about to expire."""
+    with _token_lock:
+        rows = db.select("user_tokens", {"user_id": user_id},
+                         columns=["user_id", "access_token", "refresh_token", "expires_at"], order_by="user_id")
+        if not rows:
+            raise LookupError(f"no Strava tokens for user {user_id}")
+        tok = rows[0]
+        if int(tok.get("expires_at") or 0) > time.time() + TOKEN_MARGIN_S:
+            return tok["access_token"]
+        fresh = su.refresh_token(tok["refresh_token"])
+        db.save_tokens(user_id, fresh)
+        db.invalidate("user_tokens")
+        return fresh["access_token"]
+
+
+# ---------- job handlers ----------
+def enqueue_sync(queue: JobQueue, user_id: str) -> int:
+    return queue.enqueue("sync_user", {"user_id": user_id},
+                         dedupe_key=f"sync:{user_id}", serial_key=f"sync:{user_id}")
+
+
+def enqueue_activity(queue: JobQueue, user_id: str, activity_id, start_date_utc: str) -> int:
+    return queue.enqueue("fetch_streams",
+                         {"user_id": user_id, "activity_id": activity_id, "start_date_utc": start_date_utc},
+                         dedupe_key=f"streams:{activity_id}")
+
+
+def handle_sync_user(queue: JobQueue, p: Dict[str, Any]) -> Dict[str, Any]:
+    uid = p["user_id"]
+
+    def schedule(rows):
+        for r in rows:
+            enqueue_activity(queue, uid, r["id"], r["start_date_utc"])
+
+    n = sync.sync_activities(access_token_for(uid), uid, on_rows=schedule)
+    return {"synced": n}
+
+
+def handle_fetch_streams(queue: JobQueue, p: Dict[str, Any]) -> Dict[str, Any]:
+    streams = su.get_streams(p["activity_id"], access_token_for(p["user_id"]))
+    queue.enqueue("run_etl", p, dedupe_key=f"etl:{p['activity_id']}", serial_key=f"user:{p['user_id']}")
+    return {"keys": sorted(streams)}
+
+
+def handle_run_etl(queue: JobQueue, p: Dict[str, Any]) -> Dict[str, Any]:
+    uid, aid = p["user_id"], p["activity_id"]
+    streams = stream_store.default_store().get(aid)
+    if streams is None:
+        streams = su.get_streams(aid, access_token_for(uid))
+    frame = ActivityFrame.from_streams(streams).compute_grade()
+    bins = frame.bins()
+
+    season = fold_season_best(queue, uid, meanmax.activity_curve(pd.DataFrame({"v": frame.v}), aid))
+    cs_kmh, wprime_m, n_pts = fit_cs(season)
+
+    zt = etl.zone_table(bins, cs_kmh, etl.zones_from_config(_secrets("app")))
+    queue.enqueue("write_aggregates", {**p, "zones": _records(zt)},
+                  dedupe_key=f"agg:{aid}", serial_key=f"user:{uid}")
+    return {"activity_id": aid, "cs_kmh": cs_kmh, "wprime_m": wprime_m, "n_points": n_pts,
+            "bins": _records(bins), "zones": _records(zt)}
+
+
+def handle_write_aggregates(queue: JobQueue, p: Dict[str, Any]) -> Dict[str, Any]:
+    zt = pd.DataFrame(p["zones"], columns=["zone", "time_s", "load_km"])
+    return {"rows": aggregates.apply_activity(p["user_id"], p["activity_id"], p["start_date_utc"], zt)}
+
+
+def fold_activity(queue: JobQueue, user_id: str, activity_id, start_date_utc: str,
+                  streams: Dict[str, Any], zones: Dict[str, Any]) -> int:
+    """
+    Inline-mode run_etl + write_aggregates for one synced run: fold it into the
+    stored season best, zone it at that CS and apply it to the aggregates.
+    """
+    frame = ActivityFrame.from_streams(streams).compute_grade()
+    season = fold_season_best(queue, user_id, meanmax.activity_curve(pd.DataFrame({"v": frame.v}), activity_id))
+    cs_kmh, _, _ = fit_cs(season)
+    zt = etl.zone_table(frame.bins(), cs_kmh, zones)
+    return aggregates.apply_activity(user_id, activity_id, start_date_utc, zt)
+
+
+def unfolded_runs(user_id: str) -> List[Dict[str, Any]]:
+    """Synced runs not yet in the history aggregates, oldest first; ones that failed before go last."""
+    rows = db.select("activities", {"user_id": user_id, "folded": False}, cache=True)
+    return sorted(rows, key=lambda r: (bool(r.get("fold_error")), str(r["start_date_utc"])))
+
+
+def fold_pending(queue: JobQueue, user_id: str, access_token: str, zones: Dict[str, Any],
+                 limit: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Fold up to `limit` (default FOLD_BATCH) unfolded runs (inline mode). Each run is marked folded,
+    or keeps its error and stays pending, as soon as it is done, so an
+    interrupted call loses nothing. Stops early when the daily Strava budget
+    is used up.
+    """
+    rows = {r["id"]: r for r in unfolded_runs(user_id)[:limit or FOLD_BATCH]}
+    out: Dict[str, Any] = {"folded": 0, "failed": {}, "stopped": None}
+    try:
+        for aid, streams in su.iter_streams(list(rows), access_token, return_exceptions=True):
+            r = rows[aid]
+            try:
+                if isinstance(streams, Exception):
+                    raise streams
+                fold_activity(queue, user_id, aid, r["start_date_utc"], streams, zones)
+                db.upsert("activities", [{**r, "folded": True, "fold_error": None}])
+                out["folded"] += 1
+            except Exception as e:
+                out["failed"][aid] = str(e)
+                db.upsert("activities", [{**r, "fold_error": str(e)[:500]}])
+    except su.RateLimitExceeded as e:
+        out["stopped"] = str(e)
+    return out
+
+
+HANDLERS: Dict[str, Callable[[JobQueue, Dict[str, Any]], Any]] = {
+    "sync_user": handle_sync_user,
+    "fetch_streams": handle_fetch_streams,
+    "run_etl": handle_run_etl,
+    "write_aggregates": handle_write_aggregates,
+}
+
+
+# ---------- worker loop ----------
+def next_utc_day(now: float) -> float:
+    """Epoch seconds just after the next 00:00 UTC (when Strava's daily budget resets)."""
+    return (int(now // su.RateLimiter.DAY_S) + 1) * su.RateLimiter.DAY_S + 60
+
+
+def _retryable(e: Exception) -> bool:
+    """Bad data and 4xx (other than 429) will fail the same way again."""
+    if isinstance(e, requests.HTTPError) and e.response is not None:
+        return e.response.status_code == 429 or e.response.status_code >= 500
+    return not isinstance(e, (ValueError, LookupError, TypeError))
+
+
+def run_job(queue: JobQueue, job: Dict[str, Any], handlers=HANDLERS) -> str:
+    """Run one claimed job and record the outcome; returns the job's new status."""
+    try:
+        handler = handlers[job["kind"]]
+    except KeyError:
+        return queue.fail(job["id"], f"unknown job kind {job['kind']!r}", retry=False)
+    run = tracing.new_run(f"job {job['id']} {job['kind']}") if tracing.enabled() else None
+    try:
+        with tracing.span(f"job.{job['kind']}"):
+            result = handler(queue, job["payload"])
+    except su.RateLimitExceeded as e:
+        # the daily budget resets at 00:00 UTC; waiting for it is not a failed attempt
+        status = queue.defer(job["id"], next_utc_day(queue.clock()), f"{type(e).__name__}: {e}")
+        print(f"job {job['id']} {job['kind']} deferred to the next UTC day: {e}", file=sys.stderr)
+        return status
+    except Exception as e:
+        status = queue.fail(job["id"], f"{type(e).__name__}: {e}", retry=_retryable(e))
+        print(f"job {job['id']} {job['kind']} {status}: {type(e).__name__}: {e}", file=sys.stderr)
+        if status == "failed":
+            traceback.print_exc(file=sys.stderr)
+        return status
+    finally:
+        if run is not None and TRACE_FILE:
+            with _trace_lock, open(TRACE_FILE, "a") as f:
+                f.write(tracing.to_jsonl(run))
+    queue.complete(job["id"], result)
+    return "done"
+
+
+def run_worker(queue: JobQueue, concurrency: int = 4, poll_s: float = 1.0, once: bool = False,
+               handlers=HANDLERS) -> int:
+    """
+    Claim and run jobs on a pool of `concurrency` threads. With once=True,
+    return when nothing is runnable or running (delayed retries are left
+    queued). Returns the number of jobs run.
+    """
+    queue.requeue_stale()
+    n = 0
+    running: Dict[Any, Dict[str, Any]] = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        while True:
+            while len(running) < concurrency:
+                job = queue.claim(list(handlers))
+                if job is None:
+                    break
+                running[pool.submit(run_job, queue, job, handlers)] = job
+            if not running:
+                if once:
+                    return n
+                time.sleep(poll_s)
+                continue
+            done, _ = wait(list(running), timeout=poll_s, return_when=FIRST_COMPLETED)
+            for f in done:
+                running.pop(f)
+                f.result()
+                n += 1
+            queue.touch([j["id"] for j in running.values()])
+
+
+# ---------- webhook ----------
+def user_for_owner(owner_id) -> Optional[str]:
+    rows = db.select("users_profile", {"strava_athlete_id": int(owner_id)}, columns=["id"])
+    return rows[0]["id"] if rows else None
+
+
+def handle_event(queue: JobQueue, event: Dict[str, Any],
+                 lookup: Callable[[Any], Optional[str]] = user_for_owner) -> Optional[int]:
+    """
+    Strava push event -> job id (or None if ignored). A new activity queues a
+    sync of its owner, which picks it up past the watermark; updates only
+    touch summary fields and deletes are left to the next full reconcile.
+    """
+    if event.get("object_type") != "activity" or event.get("aspect_type") != "create":
+        return None
+    uid = lookup(event.get("owner_id"))
+    return enqueue_sync(queue, uid) if uid else None
+
+
+def queue_metrics(queue: JobQueue) -> str:
+    lines = ["# HELP onflows_jobs Jobs in the local queue by status", "# TYPE onflows_jobs gauge"]
+    lines += [f'onflows_jobs{{status="{k}"}} {v}' for k, v in sorted(queue.counts().items())]
+    return "\n".join(lines) + "\n"
+
+
+def make_webhook_server(queue: JobQueue, host: str = "127.0.0.1", port: int = 8502,
+                        verify_token: str = "", lookup: Callable[[Any], Optional[str]] = user_for_owner
+                        ) -> ThreadingHTTPServer:
+    """
+    HTTP endpoint for Strava webhook subscriptions:
+    GET answers the hub.challenge handshake, POST enqueues and returns at once.
+    GET /metrics serves span totals and queue depth in Prometheus text format.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, code: int, body: Dict[str, Any]):
+            data = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/metrics":
+                data = (tracing.to_prometheus() + queue_metrics(queue)).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                return
+            q = {k: v[0] for k, v in parse_qs(url.query).items()}
+            if q.get("hub.mode") == "subscribe" and verify_token and q.get("hub.verify_token") == verify_token:
+                self._reply(200, {"hub.challenge": q.get("hub.challenge", "")})
+            else:
+                self._reply(403, {"error": "verification failed"})
+
+        def do_POST(self):
+            try:
+                event = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            except ValueError:
+                self._reply(400, {"error": "invalid JSON"})
+                return
+            try:
+                job_id = handle_event(queue, event, lookup)
+            except Exception as e:
+                print(f"webhook event not queued: {type(e).__name__}: {e}", file=sys.stderr)
+                job_id = None
+            self._reply(200, {"job_id": job_id})
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+# ---------- CLI ----------
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="onFlows background ingestion worker")
+    ap.add_argument("--queue", default=None, help="SQLite queue file (default: ONFLOWS_QUEUE or .cache/jobs.sqlite)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    run = sub.add_parser("run", help="process queued jobs")
+    run.add_argument("--concurrency", type=int, default=4)
+    run.add_argument("--poll", type=float, default=1.0)
+    run.add_argument("--once", action="store_true", help="exit when the queue is drained")
+    run.add_argument("--trace", action="store_true", help="record spans (see ONFLOWS_TRACE_FILE, /metrics)")
+    run.add_argument("--metrics-port", type=int, default=None,
+                     help="also serve /metrics (and the webhook) from this process")
+    hook = sub.add_parser("webhook", help="serve the Strava webhook endpoint")
+    hook.add_argument("--host", default="127.0.0.1")
+    hook.add_argument("--port", type=int, default=8502)
+    hook.add_argument("--verify-token", default=os.environ.get("STRAVA_VERIFY_TOKEN")
+                      or _secrets("strava").get("webhook_verify_token", ""))
+    enq = sub.add_parser("enqueue", help="queue a sync for a user")
+    enq.add_argument("user_id")
+    sub.add_parser("status", help="job counts by status")
+    args = ap.parse_args(argv)
+
+    queue = JobQueue(args.queue) if args.queue else JobQueue()
+    if args.cmd == "run":
+        if args.trace:
+            tracing.enable()
+        if args.metrics_port:
+            server = make_webhook_server(queue, "127.0.0.1", args.metrics_port,
+                                         _secrets("strava").get("webhook_verify_token", ""))
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        n = run_worker(queue, concurrency=args.concurrency, poll_s=args.poll, once=args.once)
+        print(f"ran {n} jobs", file=sys.stderr)
+    elif args.cmd == "webhook":
+        server = make_webhook_server(queue, args.host, args.port, args.verify_token)
+        print(f"webhook listening on http://{args.host}:{args.port}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
+    elif args.cmd == "enqueue":
+        print(enqueue_sync(queue, args.user_id))
+    else:
+        print(json.dumps(queue.counts()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,16 @@
+"""
+One module per sidebar view, each with render(). A view module (and what it
+pulls in, e.g. plotly) is imported the first time that view is shown.
+"""
+import importlib
+
+VIEWS = {
+    "Dashboard": "dashboard",
+    "Workloads & Zones": "workloads",
+    "VTS Profiles": "vts_profiles",
+    "Plan & Targets": "plan",
+}
+
+
+def render(view: str):
+    importlib.import_module(f"{__name__}.{VIEWS[view]}").render()
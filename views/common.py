@@ -0,0 +1,134 @@
+"""
+Shared state for the views: config, cached data loaders and session helpers.
+
+Lives in a module (not the main script) so the st.cache_* wrappers are built
+once per process instead of on every rerun. Heavy or network modules (db ->
+supabase, worker) are imported inside the functions that need them.
+"""
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+import pandas as pd
+import streamlit as st
+
+try:
+    from utils import strava as su
+    from utils import etl
+    from utils import meanmax
+    from utils import ideal
+    from utils import jobs
+    from utils import tracing
+except ModuleNotFoundError:
+    import strava as su        # type: ignore
+    import etl                 # type: ignore
+    import meanmax             # type: ignore
+    import ideal               # type: ignore
+    import jobs                # type: ignore
+    import tracing             # type: ignore
+
+NO_USER = "00000000-0000-0000-0000-000000000000"
+
+
+# ================== Config ==================
+@dataclass(frozen=True)
+class Config:
+    app: Dict[str, Any]
+    zones: Dict[str, Tuple[float, float]]
+    background: bool   # ingestion runs in `python -m utils.worker`
+    debug: bool        # sidebar timings panel
+
+@st.cache_resource
+def config() -> Config:
+    """[app] secrets parsed once per process."""
+    app = dict(st.secrets.get("app", {}))
+    return Config(app=app, zones=etl.zones_from_config(app),
+                  background=bool(app.get("background_worker", False)),
+                  debug=bool(app.get("debug", False)) or tracing.enabled())
+
+@st.cache_resource
+def load_ideal_curve() -> ideal.IdealCurve:
+    for p in ("data/ideal_distance_time_speed.csv", "ideal_distance_time_speed.csv"):
+        if os.path.exists(p):
+            return ideal.IdealCurve.from_csv(p)
+    raise FileNotFoundError("ideal_distance_time_speed.csv not found in data/ or repo root")
+
+@st.cache_resource
+def get_queue() -> jobs.JobQueue:
+    return jobs.JobQueue()
+
+def load_ideal():
+    """Monotone ideal envelope as a DataFrame (speed_kmh, time_min)."""
+    return load_ideal_curve().to_frame()
+
+# ================== Cached data ==================
+# Every widget change reruns the script; these keep already-seen activities
+# free of network and ETL work. Lists go stale (new uploads), so they expire
+# quickly and are cleared after a sync; streams and ETL of one activity do not
+# change, so they only age out / get evicted by size.
+LIST_TTL_S, DATA_TTL_S = 300, 6 * 3600
+
+@st.cache_data(ttl=LIST_TTL_S, max_entries=16, show_spinner=False)
+def cached_activities(access_token: str, user_id: str, per_page: int = 10):
+    return su.list_activities(access_token, per_page=per_page)
+
+@st.cache_data(ttl=DATA_TTL_S, max_entries=8, show_spinner=False)
+def cached_streams(activity_id: int, _access_token: str):
+    return su.get_streams(activity_id, _access_token)
+
+@st.cache_data(ttl=DATA_TTL_S, max_entries=32, show_spinner="Processing streams…")
+def cached_etl(activity_id: int, _access_token: str):
+    """30 s bins and the mean-max curve of one activity."""
+    df = etl.resample_to_1hz(cached_streams(activity_id, _access_token))
+    df = etl.compute_grade(df)
+    return etl.bin30(df), meanmax.activity_curve(df, activity_id)
+
+@st.cache_data(ttl=DATA_TTL_S, max_entries=128, show_spinner=False)
+def cached_zone_table(activity_id: int, cs_kmh: float, zones: tuple, _bins: pd.DataFrame):
+    return etl.zone_table(_bins, cs_kmh, dict(zones))
+
+def clear_data_caches():
+    """After a sync: activity lists are stale; per-activity results are not."""
+    cached_activities.clear()
+
+# ================== Session ==================
+def ensure_profile():
+    if "user_id" in st.session_state:
+        return {"user_id": st.session_state["user_id"]}
+    return {"user_id": NO_USER}
+
+def activity_result(a) -> Optional[Dict[str, Any]]:
+    """
+    Worker's ETL result for this activity; queues it (once) when there is none
+    yet, and offers a retry when its last stream/ETL job failed.
+    """
+    try:
+        from utils import worker
+    except ModuleNotFoundError:
+        import worker  # type: ignore
+    q = get_queue()
+    res = q.latest_result(f"etl:{a['id']}")
+    if res is not None:
+        return res
+    uid = ensure_profile()["user_id"]
+    last = [q.latest(f"{k}:{a['id']}") for k in ("streams", "etl")]
+    pending = [j for j in last if j and j["status"] in ("queued", "running")]
+    if pending:
+        waiting = next((j for j in pending if j["status"] == "queued" and j["error"]), None)
+        if waiting:  # backing off after an error, or deferred until Strava's daily budget resets
+            st.info(f"Waiting to retry (after {pd.Timestamp(waiting['run_after'], unit='s'):%Y-%m-%d %H:%M} UTC): "
+                    f"{waiting['error']}")
+        else:
+            st.info("Processing in the background — refresh in a moment.")
+    elif any(j and j["status"] == "failed" for j in last):
+        err = next(j["error"] for j in last[::-1] if j and j["status"] == "failed")
+        st.error(f"Background processing failed: {err}")
+        if not uid.startswith("0000") and st.button("Retry", key=f"retry_{a['id']}"):
+            worker.enqueue_activity(q, uid, a["id"], a["start_date"])
+            st.info("Queued again — refresh in a moment.")
+    elif uid.startswith("0000"):
+        st.warning("No user profile yet — connect Strava first.")
+    else:
+        worker.enqueue_activity(q, uid, a["id"], a["start_date"])
+        st.info("Queued for processing — refresh in a moment.")
+    return None
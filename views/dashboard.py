@@ -0,0 +1,30 @@
+from datetime import datetime, timezone, timedelta
+
+import streamlit as st
+
+from views import common
+
+
+def render():
+    st.header("Dashboard")
+    st.write("• Connect Strava, sync activities, compute CS/W′ and baseline VTS.")
+    uid = common.ensure_profile()["user_id"]
+    if not uid.startswith("0000"):
+        try:
+            try:
+                from utils import aggregates
+            except ModuleNotFoundError:
+                import aggregates  # type: ignore
+            since = (datetime.now(timezone.utc) - timedelta(days=120)).date().isoformat()
+            acwr = aggregates.acute_chronic(aggregates.daily_load(uid, since))
+            if not acwr.empty:
+                import plotly.express as px
+                st.subheader("Acute / chronic load (km flat-equivalent per day)")
+                st.plotly_chart(px.line(acwr, x="day", y=["acute_km", "chronic_km"]), use_container_width=True)
+        except Exception as e:
+            st.caption(f"No load history yet ({e}).")
+    if st.button("Load ideal VTS CSV sample"):
+        try:
+            st.dataframe(common.load_ideal().head())
+        except Exception as e:
+            st.error(f"Could not load ideal CSV: {e}")
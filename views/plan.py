@@ -0,0 +1,40 @@
+import pandas as pd
+import plotly.express as px
+import streamlit as st
+
+from views import common
+
+
+def render():
+    st.header("Plan & Targets")
+    st.write("Simple weekly targets based on CS and your ideal curve (prototype).")
+    cs_kmh = st.number_input("CS (km/h)", value=12.0, step=0.1, key="cs_plan")
+    curve = common.load_ideal_curve()
+
+    ref = pd.DataFrame({
+        "zone": ["Z1","Z2","Z3","Z4","Z5"],
+        "r_cs": [0.70, 0.85, 0.95, 1.02, 1.12]
+    })
+    ref["v_kmh"] = ref["r_cs"] * cs_kmh
+    ref["t_opt_min"] = curve.time_for_speed(ref["v_kmh"])
+    k = {"Z1": 2.2, "Z2": 1.6, "Z3": 1.0, "Z4": 0.5, "Z5": 0.25}
+    ref["T_target_h"] = ref["zone"].map(k) * (ref["t_opt_min"] / 60.0)
+
+    cols = ["zone", "v_kmh", "t_opt_min", "T_target_h"]
+    uid = common.ensure_profile()["user_id"]
+    if not uid.startswith("0000"):
+        try:
+            try:
+                from utils import aggregates
+            except ModuleNotFoundError:
+                import aggregates  # type: ignore
+            ref = ref.merge(aggregates.weekly_zone_hours(uid), on="zone", how="left")
+            ref["actual_h"] = ref["actual_h"].fillna(0.0)
+            cols.append("actual_h")
+        except Exception as e:
+            st.caption(f"Weekly actuals unavailable ({e}).")
+
+    st.dataframe(ref[cols])
+    fig = px.bar(ref, x="zone", y=[c for c in ("T_target_h", "actual_h") if c in cols], barmode="group",
+                 title="Weekly target vs actual time by zone (hours)")
+    st.plotly_chart(fig, use_container_width=True)
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import streamlit as st
+
+from views import common
+try:
+    from utils import vts
+except ModuleNotFoundError:
+    import vts  # type: ignore
+
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def vts_figure(cs_kmh: float, wprime_m: float, deltas: tuple, dI: float):
+    """Personal curves + ideal overlay; px figure building (~30 ms) is skipped on unrelated reruns."""
+    curves = vts.vts_curves(cs_kmh, wprime_m, dict(deltas), dI)
+
+    # Personal curves (min)
+    df_plot = pd.DataFrame({
+        "v_kmh": curves["v_kmh"],
+        "Baseline": curves["baseline"] / 60.0,
+        "Modeled (Volume)": curves["volume"] / 60.0,
+        "Modeled (Volume + HR/V)": curves["hrv"] / 60.0,
+    })
+    personal = df_plot.melt(id_vars="v_kmh", var_name="Curve", value_name="t_min")
+
+    # Ideal overlay (if available)
+    try:
+        ideal_df = common.load_ideal().rename(columns={"speed_kmh": "v_kmh", "time_min": "t_min"})
+        ideal_df["Curve"] = "Ideal"
+        to_plot = pd.concat([personal, ideal_df], ignore_index=True)
+    except Exception:
+        to_plot = personal
+
+    return px.line(to_plot, x="v_kmh", y="t_min", color="Curve",
+                   title="VTS curves (time-to-exhaustion in minutes)")
+
+
+def render():
+    st.header("VTS Profiles")
+    st.write("Baseline VTS from CS/W′ plus modeled variants, with Ideal CSV overlay.")
+    cs_kmh = st.number_input("CS (km/h)", value=12.0, step=0.1)
+    wprime_m = st.number_input("W′ (m)", value=15000, step=100)
+
+    st.subheader("Volume deltas ΔTz (−0.5..+0.5)")
+    cols = st.columns(5)
+    deltas = {}
+    for i, z in enumerate(["Z1","Z2","Z3","Z4","Z5"]):
+        with cols[i]:
+            deltas[z] = st.slider(z, -0.5, 0.5, 0.0, 0.05)
+
+    dI = st.slider("ΔIglob (−0.10..+0.10)", -0.10, 0.10, 0.0, 0.01)
+    st.plotly_chart(vts_figure(cs_kmh, wprime_m, tuple(deltas.items()), dI), use_container_width=True)
+    st.caption("Guards: time is capped for stability; modeled curves are clipped to ±25% vs baseline.")
+
+    with st.expander("Sensitivity: modeled time at a target speed over CS × W′"):
+        v_target = st.slider("Target speed (km/h)", 8.0, 20.0, float(round(cs_kmh + 2.0, 1)), 0.1)
+        cs_axis = np.round(cs_kmh + np.arange(-1.0, 1.01, 0.1), 2)
+        wp_axis = np.round(wprime_m * np.linspace(0.7, 1.3, 13))
+        grid = vts.vts_sensitivity(cs_axis, wp_axis, [v_target], deltas, dI)[..., 0] / 60.0
+        fig = px.imshow(grid, x=wp_axis, y=cs_axis, origin="lower", aspect="auto",
+                        labels={"x": "W′ (m)", "y": "CS (km/h)", "color": "t (min)"},
+                        title=f"Time to exhaustion at {v_target:.1f} km/h (min)")
+        st.plotly_chart(fig, use_container_width=True)
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import streamlit as st
+
+from views import common
+try:
+    from utils import etl
+    from utils import meanmax
+except ModuleNotFoundError:
+    import etl                 # type: ignore
+    import meanmax             # type: ignore
+
+
+def render():
+    cfg = common.config()
+    st.header("Workloads & Zones")
+    if "tokens" not in st.session_state:
+        st.info("Connect Strava first.")
+        return
+    access = st.session_state["tokens"]["access_token"]
+    try:
+        acts = common.cached_activities(access, common.ensure_profile()["user_id"])
+    except Exception as e:
+        st.error(f"Could not list activities: {e}")
+        acts = []
+
+    options = {
+        f'{a["name"]} — {a["start_date"][:10]} ({round(a.get("distance",0)/1000,1)} km)': a
+        for a in acts if a.get("type","") in ("Run","TrailRun","VirtualRun")
+    }
+
+    if not options:
+        st.info("No recent runs. Hit 'Sync recent Strava' first.")
+        return
+    choice = st.selectbox("Activity", list(options.keys()))
+    a = options[choice]
+    res = common.activity_result(a) if cfg.background else None
+    if cfg.background:
+        bins = pd.DataFrame(res["bins"]) if res else pd.DataFrame()
+    else:
+        try:
+            bins, curve = common.cached_etl(a["id"], access)
+        except Exception as e:
+            st.error(f"Failed to process streams: {e}")
+            bins = pd.DataFrame()
+
+    if bins.empty:
+        return
+    st.subheader("Bins (30s) preview")
+    st.dataframe(bins.head(20))
+
+    if res is not None:
+        # the worker keeps the season-best curve and fits CS/W′
+        cs_kmh, wprime_m, n_pts = res["cs_kmh"], res["wprime_m"], res["n_points"]
+    else:
+        # CS/W′ from the user's stored season-best curve (kept by the sync/worker);
+        # this activity is merged in for display only, browsing never writes it
+        try:
+            from utils import worker
+        except ModuleNotFoundError:
+            import worker  # type: ignore
+        uid = common.ensure_profile()["user_id"]
+        stored = None if uid.startswith("0000") else worker.season_best(common.get_queue(), uid)
+        season = meanmax.merge_best(stored, curve)
+        cs_kmh, wprime_m, n_pts = worker.fit_cs(season)
+
+    if n_pts >= 3:
+        st.info(f"Estimated CS={cs_kmh:.2f} km/h, W′={int(wprime_m)} m "
+                f"(season-best curve, {n_pts} durations)")
+    else:
+        st.warning("Not enough steady windows; using defaults (CS=12 km/h, W′=15000 m).")
+
+    zt = common.cached_zone_table(a["id"], float(cs_kmh), tuple(sorted(cfg.zones.items())), bins)
+    st.subheader("Zone aggregates")
+    st.dataframe(zt)
+
+    fig = px.bar(zt, x="zone", y="time_s", title="Time by zone (s)")
+    st.plotly_chart(fig, use_container_width=True)
+
+    with st.expander("CS sensitivity: minutes per zone for CS ± 0.75 km/h"):
+        valid = bins[bins["valid_bin"]]
+        sweep = etl.zone_time_matrix(valid["vflat_kmh"], valid["seconds"],
+                                     np.round(cs_kmh + np.arange(-0.75, 0.76, 0.25), 2), cfg.zones)
+        st.dataframe((sweep / 60.0).round(1).rename_axis("CS (km/h)"))